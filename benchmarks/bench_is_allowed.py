@@ -0,0 +1,56 @@
+# Per-item cost of the allow/ignore filtering, before (one re.search per pattern and
+# item) and after (patterns compiled once into a Matcher).
+#
+#   python benchmarks/bench_is_allowed.py
+import random
+import re
+import string
+import timeit
+
+from deadlink._main import Matcher
+
+
+def is_allowed_before(item, allow_set, ignore_set):
+    for a in allow_set:
+        if re.search(a, item) is None:
+            return False
+    for i in ignore_set:
+        if re.search(i, item) is not None:
+            return False
+    return True
+
+
+def random_word(k):
+    return "".join(random.choices(string.ascii_lowercase, k=k))
+
+
+def main(num_urls=40_000, num_patterns=150):
+    random.seed(0)
+    hosts = [
+        f"{random_word(8)}.{random.choice(['com', 'org', 'io'])}" for _ in range(500)
+    ]
+    urls = [
+        f"https://{random.choice(hosts)}/{random_word(6)}/{random_word(10)}"
+        for _ in range(num_urls)
+    ]
+    # a mix of literal substrings and regexes, like in typical config files
+    ignore = set(random.sample(hosts, num_patterns // 2))
+    ignore |= {f"{random_word(5)}\\.(com|org)/" for _ in range(num_patterns // 2)}
+    allow = {"https:"}
+
+    t = timeit.timeit(
+        lambda: [is_allowed_before(u, allow, ignore) for u in urls], number=1
+    )
+    print(f"before: {t / num_urls * 1e6:6.2f} µs per URL")
+
+    matcher = Matcher(allow, ignore)
+    t = timeit.timeit(lambda: [matcher(u) for u in urls], number=1)
+    print(f"after:  {t / num_urls * 1e6:6.2f} µs per URL")
+
+    assert [matcher(u) for u in urls] == [
+        is_allowed_before(u, allow, ignore) for u in urls
+    ]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+# A local farm of HTTP servers that simulates many hosts, and a synthetic document
+# tree linking to them.
+#
+# Every simulated host ("host0.test", "host1.test", ...) is an asyncio server on its
+# own port on 127.0.0.1, so connection pooling behaves like it would with real hosts.
+# FarmTransport routes requests for the simulated hosts to their servers. The path of
+# a URL determines the response:
+#
+#   /ok/...                 200
+#   /dead/...               404
+#   /redirect/<n>/...       a chain of n permanent redirects, then 200
+#   /ratelimit/<n>/...      429 (Retry-After: 0) for the first n requests, then 200
+#   /slow/...               200 after `slow_delay` seconds, i.e., a timeout
+#
+# Every response is delayed by `latency` seconds, every new connection by `handshake`
+# seconds, which simulates the round trips of the TCP and TLS handshakes (default:
+# three times the latency). With `http2`, the servers speak
+# HTTP/2 with prior knowledge (h2c) instead of HTTP/1.1; this requires the h2 package.
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import random
+import time
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from deadlink._transport import HostPoolTransport
+
+reasons = {200: "OK", 301: "Moved Permanently", 404: "Not Found", 429: "Too Many"}
+
+
+class Farm:
+    def __init__(
+        self,
+        num_hosts: int = 50,
+        latency: float = 0.01,
+        slow_delay: float = 30.0,
+        http2: bool = False,
+        handshake: float | None = None,
+    ):
+        self.hosts = [f"host{k}.test" for k in range(num_hosts)]
+        self.latency = latency
+        self.handshake = 3 * latency if handshake is None else handshake
+        self.slow_delay = slow_delay
+        self.http2 = http2
+        self.ports = {}
+        self.connections = Counter()
+        self.requests = Counter()
+        self._servers = []
+        self._handlers = set()
+        self._hits = Counter()
+
+    # The servers run in a separate process so that they don't compete with the
+    # client for the GIL; the counters are available after the farm has been shut down.
+    def __enter__(self):
+        self._conn, child = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=self._serve, args=(child,), daemon=True
+        )
+        self._process.start()
+        self.ports = self._conn.recv()
+        return self
+
+    def __exit__(self, *args):
+        self._conn.send("stop")
+        self.connections, self.requests = self._conn.recv()
+        self._process.join()
+
+    def _serve(self, conn):
+        async def main():
+            await self._start()
+            conn.send(self.ports)
+            await asyncio.get_running_loop().run_in_executor(None, conn.recv)
+            await self._stop()
+            conn.send((self.connections, self.requests))
+
+        asyncio.run(main())
+
+    async def _start(self):
+        for host in self.hosts:
+            handle = self._handle_h2 if self.http2 else self._handle
+            server = await asyncio.start_server(
+                lambda r, w, host=host, handle=handle: handle(host, r, w),
+                "127.0.0.1",
+                0,
+            )
+            self.ports[host] = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+
+    async def _stop(self):
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        # open keep-alive connections and slow responses
+        for task in self._handlers:
+            task.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+
+    async def _respond(self, host: str, target: str):
+        await asyncio.sleep(self.latency)
+        parts = target.split("/")
+        kind = parts[1] if len(parts) > 1 else ""
+        if kind == "dead":
+            return 404, {}
+        if kind == "redirect" and int(parts[2]) > 0:
+            parts[2] = str(int(parts[2]) - 1)
+            return 301, {"Location": "/".join(parts)}
+        if kind == "ratelimit":
+            self._hits[host, target] += 1
+            if self._hits[host, target] <= int(parts[2]):
+                return 429, {"Retry-After": "0"}
+        if kind == "slow":
+            await asyncio.sleep(self.slow_delay)
+        return 200, {}
+
+    async def _handle(self, host: str, reader, writer):
+        self.connections[host] += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        try:
+            await asyncio.sleep(self.handshake)
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode().split(" ", 2)
+                while (await reader.readline()) not in [b"\r\n", b"\n", b""]:
+                    pass
+                self.requests[host] += 1
+                status_code, headers = await self._respond(host, target)
+                body = b"<html></html>" if method == "GET" else b""
+                head = [f"HTTP/1.1 {status_code} {reasons[status_code]}"]
+                head += [f"{key}: {value}" for key, value in headers.items()]
+                head += ["Content-Type: text/html", f"Content-Length: {len(body)}"]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # CancelledError: shut down in _stop()
+            pass
+        finally:
+            writer.close()
+            self._handlers.discard(task)
+
+    async def _handle_h2(self, host: str, reader, writer):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        self.connections[host] += 1
+        task = asyncio.current_task()
+        self._handlers.add(task)
+        conn = h2.connection.H2Connection(
+            h2.config.H2Configuration(client_side=False, header_encoding="utf-8")
+        )
+        streams = set()
+
+        async def respond(stream_id: int, method: str, target: str):
+            status_code, headers = await self._respond(host, target)
+            body = b"<html></html>" if method == "GET" else b""
+            head = [(":status", str(status_code)), ("content-type", "text/html")]
+            head += [(key.lower(), value) for key, value in headers.items()]
+            head += [("content-length", str(len(body)))]
+            try:
+                conn.send_headers(stream_id, head, end_stream=not body)
+                if body:
+                    conn.send_data(stream_id, body, end_stream=True)
+            except h2.exceptions.StreamClosedError:
+                # cancelled by the client
+                return
+            writer.write(conn.data_to_send())
+
+        try:
+            await asyncio.sleep(self.handshake)
+            conn.initiate_connection()
+            writer.write(conn.data_to_send())
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.RequestReceived):
+                        headers = dict(event.headers)
+                        self.requests[host] += 1
+                        stream = asyncio.ensure_future(
+                            respond(
+                                event.stream_id, headers[":method"], headers[":path"]
+                            )
+                        )
+                        streams.add(stream)
+                        stream.add_done_callback(streams.discard)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        return
+                writer.write(conn.data_to_send())
+        except (ConnectionError, asyncio.CancelledError):
+            # CancelledError: shut down in _stop()
+            pass
+        finally:
+            for stream in streams:
+                stream.cancel()
+            writer.close()
+            self._handlers.discard(task)
+
+
+class _ToFarm(httpx.AsyncBaseTransport):
+    # Sends requests for the simulated hosts to their local servers and records the
+    # latency of every request.
+    def __init__(self, ports: dict[str, int], latencies: list, transport):
+        self.ports = ports
+        self.latencies = latencies
+        self._transport = transport
+
+    async def handle_async_request(self, request):
+        port = self.ports[request.url.host]
+        request.url = request.url.copy_with(scheme="http", host="127.0.0.1", port=port)
+        t = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        self.latencies.append(time.perf_counter() - t)
+        return response
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class FarmTransport(HostPoolTransport):
+    # A connection pool per host like deadlink uses by default. For h2c, pass
+    # `http1=False, http2=True`. Can be sent to worker processes; their latencies
+    # aren't recorded here, though. The simulated hosts are local; proxies from the
+    # environment are ignored.
+    def __init__(self, farm: Farm, **kwargs):
+        kwargs.setdefault("trust_env", False)
+        super().__init__(**kwargs)
+        self.ports = farm.ports
+        self.latencies = []
+
+    def _new_pool(self, host: str, proxy: str | None = None):
+        return _ToFarm(self.ports, self.latencies, super()._new_pool(host, proxy))
+
+
+class SinglePoolFarmTransport(_ToFarm):
+    # One connection pool for all hosts like a plain httpx.AsyncClient
+    def __init__(self, farm: Farm, **kwargs):
+        super().__init__(farm.ports, [], httpx.AsyncHTTPTransport(**kwargs))
+
+
+def random_urls(hosts: list[str], num_urls: int, mix: dict[str, float], seed=0):
+    # `mix` gives the fraction of each URL kind, e.g., {"dead": 0.05, "slow": 0.01};
+    # the rest is "ok".
+    rng = random.Random(seed)
+    kinds = list(mix) + ["ok"]
+    weights = list(mix.values()) + [max(0.0, 1.0 - sum(mix.values()))]
+    urls = []
+    for k in range(num_urls):
+        kind = rng.choices(kinds, weights)[0]
+        host = rng.choice(hosts)
+        if kind in ["redirect", "ratelimit"]:
+            kind += f"/{rng.randint(1, 3)}"
+        urls.append(f"https://{host}/{kind}/{k}")
+    return urls
+
+
+def generate_tree(root, urls: list[str], num_files: int, files_per_dir: int = 50):
+    # Distribute the URLs over `num_files` Markdown files in nested directories.
+    # Every URL appears twice to exercise deduplication.
+    root = Path(root)
+    files = []
+    for k in range(num_files):
+        directory = root.joinpath(*[f"d{j}" for j in str(k // files_per_dir)])
+        directory.mkdir(parents=True, exist_ok=True)
+        files.append(directory / f"file{k}.md")
+    for k, f in enumerate(files):
+        lines = ["# Document", ""]
+        lines += [f"See [link]({url}) and {url}." for url in urls[k::num_files]]
+        f.write_text("\n".join(lines) + "\n")
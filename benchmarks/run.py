@@ -0,0 +1,191 @@
+# Throughput benchmark against a local farm of simulated hosts, e.g.,
+#
+#   python benchmarks/run.py --urls 5000 --hosts 50 --latency 0.02
+#
+# Reports the time spent scanning a synthetic document tree (find_files, find_urls),
+# checking the URLs (categorize_urls), URLs per second, request latencies and the
+# peak memory usage. Use --json to store the numbers for comparisons.
+from __future__ import annotations
+
+import argparse
+import json
+import resource
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from farm import (
+    Farm,
+    FarmTransport,
+    SinglePoolFarmTransport,
+    generate_tree,
+    random_urls,
+)
+
+import deadlink
+from deadlink._main import find_files, find_urls
+from deadlink._transport import keepalive_per_host
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / 1024**2 if sys.platform == "darwin" else rss / 1024
+
+
+def percentile(values: list[float], p: float) -> float:
+    if len(values) == 0:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100 * len(values)))]
+
+
+# the category of the URLs of every kind in `random_urls`; rate-limited URLs succeed
+# after retrying
+expected_categories = {
+    "ok": "OK",
+    "dead": "Client errors",
+    "redirect": "Successful permanent redirects",
+    "ratelimit": "OK",
+    "slow": "Timeouts",
+}
+
+
+def check_results(results: dict, mix: dict[str, float]):
+    # A broken setup, e.g., a transport that fails every request, would still report
+    # plausible timings; fail loudly instead.
+    if results["requests"] == 0:
+        sys.exit("error: the farm didn't answer any requests")
+    expected = {"OK"} | {expected_categories[kind] for kind, f in mix.items() if f > 0}
+    unexpected = set(results["categories"]) - expected
+    if unexpected:
+        sys.exit(f"error: unexpected categories {sorted(unexpected)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark deadlink locally.")
+    parser.add_argument("--urls", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=50)
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--handshake", type=float, default=None)
+    parser.add_argument("--dead", type=float, default=0.05)
+    parser.add_argument("--redirect", type=float, default=0.1)
+    parser.add_argument("--ratelimit", type=float, default=0.0)
+    parser.add_argument("--slow", type=float, default=0.0)
+    parser.add_argument("--timeout", type=float, default=1.0)
+    parser.add_argument("--max-connections", type=int, default=100)
+    parser.add_argument(
+        "--max-keepalive-connections",
+        type=int,
+        default=None,
+        help="default: derived from the URLs per host, like deadlink does",
+    )
+    parser.add_argument("--max-connections-per-host", type=int, default=10)
+    parser.add_argument("--http2", action="store_true", help="use HTTP/2 (h2c)")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="check in this many processes; latencies are only recorded for 1",
+    )
+    parser.add_argument(
+        "--single-pool",
+        action="store_true",
+        help="share one connection pool between all hosts, like a plain AsyncClient",
+    )
+    parser.add_argument("--json", type=str, default=None, help="write results here")
+    args = parser.parse_args(argv)
+
+    mix = {
+        "dead": args.dead,
+        "redirect": args.redirect,
+        "ratelimit": args.ratelimit,
+        "slow": args.slow,
+    }
+    results = {}
+    farm = Farm(
+        args.hosts, args.latency, slow_delay=10 * args.timeout, http2=args.http2
+    )
+    with farm:
+        urls = random_urls(farm.hosts, args.urls, mix)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            generate_tree(tmpdir, urls, args.files)
+
+            t = time.perf_counter()
+            files = find_files([tmpdir])
+            results["find_files [s]"] = time.perf_counter() - t
+
+            t = time.perf_counter()
+            found = find_urls(files)
+            results["find_urls [s]"] = time.perf_counter() - t
+            assert found == set(urls)
+
+        # httpx ignores the limits and the HTTP version of the client when a custom
+        # transport is given; set them up like deadlink does.
+        if args.single_pool:
+            keepalive = args.max_keepalive_connections or 10
+            limits = httpx.Limits(
+                max_connections=args.max_connections,
+                max_keepalive_connections=keepalive,
+            )
+            transport = SinglePoolFarmTransport(
+                farm, limits=limits, http1=not args.http2, http2=args.http2
+            )
+        else:
+            keepalive = args.max_keepalive_connections
+            if keepalive is None:
+                keepalive = keepalive_per_host(
+                    found, args.max_connections_per_host, args.http2
+                )
+            transport = FarmTransport(
+                farm,
+                max_per_host=args.max_connections_per_host,
+                max_hosts=args.max_connections,
+                keepalive=keepalive,
+                http1=not args.http2,
+                http2=args.http2,
+            )
+            if isinstance(keepalive, dict):
+                keepalive = sum(keepalive.values())
+        results["keep-alive connections"] = keepalive
+        t = time.perf_counter()
+        d = deadlink.categorize_urls(
+            found,
+            timeout=args.timeout,
+            max_connections=args.max_connections,
+            max_connections_per_host=args.max_connections_per_host,
+            http2=args.http2,
+            transport=transport,
+            workers=args.workers,
+        )
+        duration = time.perf_counter() - t
+
+    results["categorize_urls [s]"] = duration
+    results["URLs/s"] = len(found) / duration
+    results["requests"] = sum(farm.requests.values())
+    results["connections"] = sum(farm.connections.values())
+    results["request latency p50 [ms]"] = 1000 * percentile(transport.latencies, 50)
+    results["request latency p99 [ms]"] = 1000 * percentile(transport.latencies, 99)
+    results["request latency mean [ms]"] = 1000 * statistics.mean(
+        transport.latencies or [float("nan")]
+    )
+    results["peak RSS [MB]"] = peak_rss_mb()
+    results["categories"] = {key: len(value) for key, value in d.items() if value}
+
+    for key, value in results.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"{key:>28}: {value}")
+    check_results(results, mix)
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
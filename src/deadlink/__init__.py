@@ -1,5 +1,21 @@
 from .__about__ import __version__
 from ._cli import cli
-from ._main import categorize_urls
 
-__all__ = ["categorize_urls", "cli", "__version__"]
+__all__ = [
+    "Info",
+    "categorize",
+    "categorize_urls",
+    "check_urls",
+    "cli",
+    "__version__",
+]
+
+
+def __getattr__(name):
+    # The checking machinery pulls in httpx and friends; only import it once it's
+    # used such that the CLI starts quickly.
+    if name in ["Info", "categorize", "categorize_urls", "check_urls"]:
+        from . import _main
+
+        return getattr(_main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
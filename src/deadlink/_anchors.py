@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import asyncio
+from html.parser import HTMLParser
+from urllib.parse import unquote, urldefrag
+
+# Don't read more than this from a single page
+max_page_size = 10 * 1024 * 1024
+
+
+class AnchorParser(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.anchors = set()
+
+    def handle_starttag(self, tag, attrs):
+        for name, value in attrs:
+            if value is not None and (name == "id" or (name == "name" and tag == "a")):
+                self.anchors.add(value)
+
+
+def is_checkable(fragment: str) -> bool:
+    # Skip fragments that aren't element ids, e.g., hashbang routes (#!/path, #/path)
+    # or text fragments (#:~:text=...).
+    return fragment != "" and fragment[0] not in "!/" and ":~:" not in fragment
+
+
+async def _fetch_anchors(
+    client, url: str, timeout: float, headers: dict[str, str]
+) -> set[str] | None:
+    # Stream the page through the HTML tokenizer; only the anchor names are kept.
+    # Returns None if the page can't be inspected.
+    parser = AnchorParser()
+    try:
+        async with client.stream(
+            "GET", url, follow_redirects=True, timeout=timeout, headers=headers
+        ) as r:
+            if r.status_code >= 400 or "html" not in r.headers.get("content-type", ""):
+                return None
+            num_bytes = 0
+            async for chunk in r.aiter_text():
+                parser.feed(chunk)
+                num_bytes += len(chunk)
+                if num_bytes > max_page_size:
+                    break
+    except Exception:
+        return None
+    parser.close()
+    return parser.anchors
+
+
+# Every page is downloaded and parsed only once, no matter how many URLs point into
+# it; concurrent requests for the same page wait for the same task.
+class AnchorCache:
+    def __init__(self, client, timeout: float, headers: dict[str, str], scheduler):
+        self.client = client
+        self.timeout = timeout
+        self.headers = headers
+        self.scheduler = scheduler
+        self._pages = {}
+
+    def cancel(self):
+        for page in self._pages.values():
+            page.cancel()
+
+    async def _fetch(self, page: str):
+        async with self.scheduler.slot(page):
+            return await _fetch_anchors(self.client, page, self.timeout, self.headers)
+
+    async def has_anchor(self, url: str) -> bool | None:
+        # None if undecidable, e.g., if the target isn't an HTML page
+        page, fragment = urldefrag(url)
+        if not is_checkable(fragment):
+            return None
+        if page not in self._pages:
+            self._pages[page] = asyncio.ensure_future(self._fetch(page))
+        anchors = await self._pages[page]
+        if anchors is None:
+            return None
+        return fragment in anchors or unquote(fragment) in anchors
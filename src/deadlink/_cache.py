@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+from pathlib import Path
+
+from ._main import Info, categorize, error_categories
+
+# Time-to-live in seconds for cached results, per outcome category. Stable outcomes
+# are kept for long, transient ones are rechecked soon.
+default_ttl = {
+    "OK": 7 * 24 * 3600,
+    "Missing anchors": 3600,
+    "Successful permanent redirects": 24 * 3600,
+    "Failing permanent redirects": 3600,
+    "Non-permanent redirects": 24 * 3600,
+    "Client errors": 3600,
+    "Server errors": 300,
+    "Timeouts": 300,
+    "Other errors": 300,
+    "Other HTTP errors": 300,
+    "SSL certificate errors": 3600,
+}
+
+
+def default_cache_path() -> Path:
+    import appdirs
+
+    return Path(appdirs.user_cache_dir()) / "deadlink" / "results.sqlite"
+
+
+def read_ttl(d: dict) -> dict[str, float]:
+    # Categories can be given in config.toml as, e.g.,
+    # ```
+    # [cache_ttl]
+    # ok = 604800
+    # server_errors = 60
+    # ```
+    ttl = default_ttl.copy()
+    config_ttl = d.get("cache_ttl", {})
+    for key in ttl:
+        config_key = key.lower().replace(" ", "_")
+        if config_key in config_ttl:
+            ttl[key] = float(config_ttl[config_key])
+    return ttl
+
+
+class ResultCache:
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        ttl: dict[str, float] | None = None,
+        max_age: float | None = None,
+    ):
+        path = default_cache_path() if path is None else Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = default_ttl if ttl is None else ttl
+        self.max_age = max_age
+        # URLs may be looked up from the thread that discovers them
+        self._con = sqlite3.connect(str(path), check_same_thread=False)
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS results "
+            "(url TEXT PRIMARY KEY, seq TEXT, category TEXT, checked REAL)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def commit(self):
+        self._con.commit()
+
+    def close(self):
+        self._con.commit()
+        self._con.close()
+
+    def _max_age(self, category: str) -> float:
+        ttl = self.ttl.get(category, 0.0)
+        if self.max_age is not None:
+            ttl = min(ttl, self.max_age)
+        return ttl
+
+    def get(self, url: str) -> list[Info] | None:
+        row = self._con.execute(
+            "SELECT seq, category, checked FROM results WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        seq, category, checked = row
+        if time.time() - checked > self._max_age(category):
+            return None
+        return [Info(*item) for item in json.loads(seq)]
+
+    def priority(self, url: str) -> tuple[int, float]:
+        # sort key: previously failing URLs first, then unknown ones, then the others
+        # by the time of their last check
+        row = self._con.execute(
+            "SELECT category, checked FROM results WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return 1, 0.0
+        category, checked = row
+        return (0 if category in error_categories else 2), checked
+
+    def put(self, url: str, seq: list[Info]):
+        # Results that depend on the allow/ignore filters are not worth keeping,
+        # neither are URLs that haven't been checked.
+        if any(item.status_code in [None, 905] for item in seq):
+            return
+        self._con.execute(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+            (
+                url,
+                json.dumps([list(item) for item in seq]),
+                categorize(seq),
+                time.time(),
+            ),
+        )
+
+
+def cache_from_args(args, d: dict) -> ResultCache | None:
+    use_cache = d.get("cache", False) if args.cache is None else args.cache
+    if not use_cache:
+        return None
+    return ResultCache(ttl=read_ttl(d), max_age=args.max_age)
@@ -1,65 +1,85 @@
+from collections import Counter
+
+from ._cache import cache_from_args
+from ._index import failing_files
 from ._main import (
     categorize_urls,
-    find_files,
-    find_urls,
-    is_allowed,
+    error_categories,
     plural,
     print_to_screen,
     read_config,
+    scan_urls,
 )
+from ._metrics import metrics_from_args, write_metrics
+from ._occurrences import OccurrenceIndex
+from ._options import categorize_kwargs, get_matcher, open_index, since_filter
+from ._report import reporters_from_args
 
 
 def check(args) -> int:
-    # get non-hidden files in non-hidden directories
-    files = find_files(args.paths)
-
     d = read_config()
 
-    # filter files by allow-ignore-lists
-    allow_patterns = set() if args.allow_files is None else set(args.allow_files)
-    if "allow_files" in d:
-        allow_patterns = allow_patterns.union(set(d["allow_files"]))
-    ignore_patterns = set() if args.ignore_files is None else set(args.ignore_files)
-    if "ignore_files" in d:
-        ignore_patterns = ignore_patterns.union(set(d["ignore_files"]))
+    # filter files and URLs by allow-ignore-lists
+    is_allowed_file = get_matcher(args, d, "files")
+    is_allowed_url = get_matcher(args, d, "urls")
+    # only consider files that changed with respect to a git ref
+    is_changed = since_filter(args)
 
-    num_files_before = len(files)
-    files = set(
-        filter(lambda item: is_allowed(item, allow_patterns, ignore_patterns), files)
+    # get URLs from non-hidden files in non-hidden directories; they are checked
+    # while the files are still being scanned
+    stats = Counter()
+    occurrences = OccurrenceIndex()
+    metrics = metrics_from_args(args)
+    index = open_index(args, d)
+    urls = scan_urls(
+        args.paths,
+        lambda item: (is_changed is None or is_changed(item)) and is_allowed_file(item),
+        is_allowed_url,
+        stats,
+        index=index,
+        changed_only=args.incremental,
+        occurrences=occurrences,
+        metrics=metrics,
     )
-    num_ignored_files = num_files_before - len(files)
 
-    allow_patterns = set() if args.allow_urls is None else set(args.allow_urls)
-    if "allow_urls" in d:
-        allow_patterns = allow_patterns.union(set(d["allow_urls"]))
-    ignore_patterns = set() if args.ignore_urls is None else set(args.ignore_urls)
-    if "ignore_urls" in d:
-        ignore_patterns = ignore_patterns.union(set(d["ignore_urls"]))
+    reporters = reporters_from_args(args)
 
-    urls = find_urls(files)
+    def on_result(seq):
+        for reporter in reporters:
+            reporter.result(seq)
 
-    num_urls_before = len(urls)
-    urls = set(
-        filter(lambda item: is_allowed(item, allow_patterns, ignore_patterns), urls)
-    )
-    num_ignored_urls = num_urls_before - len(urls)
+    cache = cache_from_args(args, d)
+    try:
+        d = categorize_urls(
+            urls,
+            cache=cache,
+            on_result=on_result,
+            metrics=metrics,
+            compact=True,
+            **categorize_kwargs(args, d),
+        )
+        if index is not None:
+            # files with failing URLs are considered again by the next incremental run
+            failing = failing_files(
+                d, occurrences, [*error_categories, "Not checked"], is_allowed_url
+            )
+            index.mark_passed(failing)
+    finally:
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
 
-    urls_str = plural(len(urls), "unique URL")
-    files_str = plural(len(files), "file")
-    ifiles_str = plural(num_ignored_files, "file")
-    iurls_str = plural(num_ignored_urls, "URL")
+    urls_str = plural(stats["urls"], "unique URL")
+    files_str = plural(stats["files"], "file")
+    ifiles_str = plural(stats["ignored files"], "file")
+    iurls_str = plural(stats["ignored urls"], "URL")
     print(f"Found {urls_str} in {files_str} (ignored {ifiles_str}, {iurls_str})")
 
-    d = categorize_urls(
-        urls,
-        args.timeout,
-        args.max_connections,
-        args.max_keepalive_connections,
-    )
+    for reporter in reporters:
+        reporter.finish(d, occurrences)
 
-    print_to_screen(d)
-    has_errors = any(
-        len(d[key]) > 0
-        for key in ["Client errors", "Server errors", "Timeouts", "Other errors"]
-    )
+    print_to_screen(d, occurrences)
+    write_metrics(args, metrics)
+    has_errors = any(len(d[key]) > 0 for key in error_categories)
     return 1 if has_errors else 0
@@ -2,8 +2,6 @@ import argparse
 from sys import version_info
 
 from .__about__ import __version__
-from ._check import check
-from ._replace_redirects import replace_redirects
 
 
 def get_version_text(prog):
@@ -40,6 +38,12 @@ def cli(argv=None):
     _cli_check(subparser_check)
     subparser_check.set_defaults(func=check)
 
+    subparser_serve = subparsers.add_parser(
+        "serve", help="Check URLs for other deadlink runs on this machine"
+    )
+    _cli_serve(subparser_serve)
+    subparser_serve.set_defaults(func=serve)
+
     subparser_rr = subparsers.add_parser(
         "replace-redirects", help="Replaces permanent redirects", aliases=["rr"]
     )
@@ -50,8 +54,79 @@ def cli(argv=None):
     return args.func(args)
 
 
+# The subcommands are only imported when they run; `deadlink --version` and `--help`
+# don't need any of the checking machinery.
+def check(args):
+    from ._check import check
+
+    return check(args)
+
+
+def replace_redirects(args):
+    from ._replace_redirects import replace_redirects
+
+    return replace_redirects(args)
+
+
+def serve(args):
+    from ._server import serve
+
+    return serve(args)
+
+
 def _cli_check(parser):
     parser.add_argument("paths", type=str, nargs="+", help="files or paths to check")
+    parser.add_argument(
+        "--server",
+        type=str,
+        nargs="?",
+        default=None,
+        const="",
+        metavar="SOCKET",
+        help="let a running `deadlink serve` check the URLs "
+        + "(default socket: in the user cache directory)",
+    )
+    parser.add_argument(
+        "--fail-fast",
+        default=False,
+        action="store_true",
+        help="stop at the first dead link (default: false)",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="stop checking after this many seconds and report what has been "
+        + "checked; with --cache, previously failing and stale URLs go first",
+    )
+    parser.add_argument(
+        "--jsonl",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write one JSON line per URL to FILE as soon as it has been checked",
+    )
+    parser.add_argument(
+        "--junit",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write a JUnit XML report to FILE",
+    )
+    parser.add_argument(
+        "--sarif",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write a SARIF report with the location of every URL to FILE",
+    )
+    parser.add_argument(
+        "--check-anchors",
+        default=None,
+        action="store_true",
+        help="check if the #fragment of a URL exists on the page (default: false)",
+    )
     parser.add_argument(
         "-t",
         "--timeout",
@@ -70,8 +145,9 @@ def _cli_check(parser):
         "-k",
         "--max-keepalive-connections",
         type=int,
-        default=10,
-        help="number of allowable keep-alive connections (default: 10)",
+        default=None,
+        help="number of keep-alive connections per host "
+        + "(default: from config, otherwise derived from the number of URLs per host)",
     )
     parser.add_argument(
         "-a",
@@ -101,6 +177,11 @@ def _cli_check(parser):
         nargs="+",
         help="ignore file names containing these strings (e.g., .svg)",
     )
+    _cli_workers(parser)
+    _cli_scheduler(parser)
+    _cli_cache(parser)
+    _cli_incremental(parser)
+    _cli_stats(parser)
 
 
 def _cli_replace_redirects(parser):
@@ -123,8 +204,9 @@ def _cli_replace_redirects(parser):
         "-k",
         "--max-keepalive-connections",
         type=int,
-        default=10,
-        help="number of allowable keep-alive connections (default: 10)",
+        default=None,
+        help="number of keep-alive connections per host "
+        + "(default: from config, otherwise derived from the number of URLs per host)",
     )
     parser.add_argument(
         "-i",
@@ -154,6 +236,11 @@ def _cli_replace_redirects(parser):
         nargs="+",
         help="ignore file names containing these strings (e.g., .svg)",
     )
+    _cli_workers(parser)
+    _cli_scheduler(parser)
+    _cli_cache(parser)
+    _cli_incremental(parser)
+    _cli_stats(parser)
     parser.add_argument(
         "-y",
         "--yes",
@@ -161,3 +248,166 @@ def _cli_replace_redirects(parser):
         action="store_true",
         help="automatic yes to prompt; useful for non-interactive runs (default: false)",
     )
+
+
+def _cli_workers(parser):
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        metavar="N",
+        help="check URLs in N processes, each with its own share of the hosts "
+        + "(default: from config, otherwise 1)",
+    )
+
+
+def _cli_scheduler(parser):
+    parser.add_argument(
+        "--http2",
+        default=None,
+        action="store_true",
+        help="use HTTP/2 where available; requests to a host share one connection, "
+        + "requires the h2 package (default: from config, otherwise false)",
+    )
+    parser.add_argument(
+        "--max-connections-per-host",
+        type=int,
+        default=None,
+        help="maximum number of concurrent requests to a single host "
+        + "(default: from config, otherwise 10)",
+    )
+    parser.add_argument(
+        "--host-delay",
+        type=float,
+        default=None,
+        help="minimum time in seconds between two requests to the same host "
+        + "(default: from config, otherwise 0)",
+    )
+    parser.add_argument(
+        "--max-retries",
+        type=int,
+        default=None,
+        help="number of retries for rate-limited (429) or unavailable (503) URLs "
+        + "(default: from config, otherwise 3)",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        default=None,
+        help="total time in seconds after which no more retries are started "
+        + "(default: from config, otherwise 60)",
+    )
+    parser.add_argument(
+        "--max-host-failures",
+        type=int,
+        default=None,
+        help="give up on a host after this many consecutive connection failures "
+        + "or timeouts; 0 to disable (default: from config, otherwise 3)",
+    )
+    parser.add_argument(
+        "--get-fallback-codes",
+        type=int,
+        nargs="*",
+        default=None,
+        metavar="CODE",
+        help="retry with GET if HEAD returns one of these status codes; "
+        + "empty to disable (default: from config, otherwise 403 404 405)",
+    )
+
+
+def _cli_serve(parser):
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="path of the unix socket to listen at "
+        + "(default: in the user cache directory)",
+    )
+    parser.add_argument(
+        "-t",
+        "--timeout",
+        type=float,
+        default=10.0,
+        help="connection timeout in seconds (default: 10)",
+    )
+    parser.add_argument(
+        "-c",
+        "--max-connections",
+        type=int,
+        default=100,
+        help="maximum number of allowable connections per client (default: 100)",
+    )
+    parser.add_argument(
+        "-k",
+        "--max-keepalive-connections",
+        type=int,
+        default=None,
+        help="number of keep-alive connections per host "
+        + "(default: from config, otherwise --max-connections-per-host)",
+    )
+    _cli_scheduler(parser)
+    _cli_cache(parser, default="true")
+
+
+def _cli_cache(parser, default: str = "from config, otherwise false"):
+    parser.add_argument(
+        "--cache",
+        dest="cache",
+        default=None,
+        action="store_true",
+        help="reuse results of previous runs that haven't expired yet "
+        + f"(default: {default})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        dest="cache",
+        action="store_false",
+        help="check all URLs over the network",
+    )
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=None,
+        help="consider cached results older than this many seconds stale",
+    )
+
+
+def _cli_incremental(parser):
+    parser.add_argument(
+        "--incremental",
+        default=False,
+        action="store_true",
+        help="only consider files that changed since the last run (default: false)",
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        default=None,
+        metavar="GIT_REF",
+        help="only consider files that differ from the given git ref, e.g., main",
+    )
+
+
+def _cli_stats(parser):
+    parser.add_argument(
+        "--stats",
+        default=False,
+        action="store_true",
+        help="print the time spent in every phase and the slowest hosts "
+        + "(default: false)",
+    )
+    parser.add_argument(
+        "--stats-json",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write timings and per-host request statistics to FILE as JSON",
+    )
+    parser.add_argument(
+        "--stats-prometheus",
+        type=str,
+        default=None,
+        metavar="FILE",
+        help="write timings and per-host request statistics to FILE in the "
+        + "Prometheus text format",
+    )
@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import mmap
+import os
+import re
+
+from ._urls import trim_end
+
+# https://regexr.com/3e6m0
+# make all groups non-capturing with ?:
+url_regex = re.compile(
+    r"http(?:s)?:\/\/.(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{2,256}\.[a-z]{2,6}\b(?:[-a-zA-Z0-9@:%_\+.~#?&/=]*)"
+)
+
+# Links in known file formats. `{u}` stands for the range of non-ASCII characters in a
+# character class, which is spelled differently in str and bytes patterns; in files,
+# non-ASCII host names (IDN) and paths are UTF-8. Host names consist of labels and a
+# top-level domain of letters of any length, e.g., https://example.museum or
+# https://bücher.example.
+_label = r"[A-Za-z0-9{u}][-A-Za-z0-9{u}]*"
+_tld = r"(?:xn--[-A-Za-z0-9]+|[A-Za-z{u}]{2,})"
+_host = rf"(?:{_label}\.)+{_tld}(?![-A-Za-z0-9{{u}}])"
+
+
+def _link(stop: str) -> str:
+    # A URL that ends before whitespace, parentheses or one of the characters `stop`.
+    # Balanced parentheses belong to the URL, e.g.,
+    # https://en.wikipedia.org/wiki/Python_(programming_language), but the one in "(see
+    # https://example.com)" doesn't.
+    chars = rf"[^\s(){stop}]"
+    return rf"https?://{_host}(?::[0-9]+)?(?:[/?#]{chars}*(?:\({chars}*\){chars}*)*)?"
+
+
+def _line_start(literal: str) -> str:
+    # Asserts that `literal`, which has just been matched, starts a line, possibly
+    # after up to three spaces. Patterns that start with the literal itself are
+    # searched for much faster than ones that start with "^".
+    literal = re.escape(literal)
+    return "(?:" + "|".join(f"(?<=^{' ' * k}{literal})" for k in range(4)) + ")"
+
+
+def _compile(pattern: str, binary: bool, flags: int):
+    if binary:
+        return re.compile(pattern.replace("{u}", r"\x80-\xff").encode(), flags)
+    return re.compile(pattern.replace("{u}", r"\x80-\U0010ffff"), flags)
+
+
+# Finds the URLs in one file format. Regions that can't contain links, e.g., code
+# blocks, are matched by the `skip` patterns; if a skipped region has a group "tag",
+# e.g., the attributes of an HTML <script> tag, that part is scanned nevertheless. A
+# URL that follows an odd number of `inline` delimiters on its line is inline code.
+# `escapes` maps escaped characters in URLs, e.g., "&amp;" in HTML, to the characters
+# they stand for.
+#
+# Every pattern is searched for separately and the matches are merged, the leftmost
+# first. Patterns that start with a literal, e.g., "http" or "```", are searched for
+# much faster than a combined pattern, which has to be tried at every character.
+class Extractor:
+    def __init__(
+        self,
+        url: str,
+        skip: list[str] | None = None,
+        inline: str | None = None,
+        flags: int = 0,
+        escapes: dict[str, str] | None = None,
+    ):
+        self._patterns = [url, *(skip or [])]
+        self._inline = inline
+        self._flags = flags
+        self._regexes = {}
+        self.escapes = {} if escapes is None else escapes
+
+    def _compiled(self, binary: bool):
+        # compiled on first use; most runs only see a few formats
+        regexes = self._regexes.get(binary)
+        if regexes is None:
+            regexes = [_compile(p, binary, self._flags) for p in self._patterns]
+            self._regexes[binary] = regexes
+        return regexes
+
+    def finditer(self, content, pos: int = 0, endpos: int | None = None):
+        # spans of all URLs in `content` (str, bytes or mmap), without trailing
+        # punctuation
+        binary = isinstance(content, (bytes, mmap.mmap))
+        url_regex, *skip_regexes = self._compiled(binary)
+        inline = self._inline
+        if inline is not None and binary:
+            inline = inline.encode()
+        if endpos is None:
+            endpos = len(content)
+        newline = b"\n" if binary else "\n"
+
+        # the next match of every skip pattern
+        skips = [regex.search(content, pos, endpos) for regex in skip_regexes]
+
+        def advance(to: int):
+            # drops the matches that start before `to`, e.g., inside a URL
+            for k, m in enumerate(skips):
+                if m is not None and m.start() < to:
+                    skips[k] = skip_regexes[k].search(content, to, endpos)
+            return min(
+                (m for m in skips if m is not None),
+                key=lambda m: m.start(),
+                default=None,
+            )
+
+        region = advance(pos)
+        skipped_until = pos
+        for m in url_regex.finditer(content, pos, endpos):
+            start = m.start()
+            # regions that start with the URL win
+            while region is not None and region.start() <= start:
+                if "tag" in region.re.groupindex and region.group("tag") is not None:
+                    yield from self.finditer(content, *region.span("tag"))
+                skipped_until = max(skipped_until, region.end())
+                region = advance(region.end())
+            if start < skipped_until:
+                continue
+            if inline is not None:
+                line_start = content.rfind(newline, 0, start) + 1
+                if content[line_start:start].count(inline) % 2 == 1:
+                    continue
+            end = trim_end(content, start, m.end())
+            if end > start:
+                yield start, end
+            if region is not None and region.start() < m.end():
+                region = advance(m.end())
+
+    def _replace(self, string, escaped: bool):
+        for code, char in self.escapes.items():
+            old, new = (code, char) if escaped else (char, code)
+            if not isinstance(string, str):
+                old, new = old.encode(), new.encode()
+            string = string.replace(old, new)
+        return string
+
+    def unescape(self, raw):
+        # the URL in the span `raw` (str or bytes)
+        return self._replace(raw, True)
+
+    def escape(self, url):
+        # how `url` (str or bytes) is written in the file
+        return self._replace(url, False)
+
+    def decode(self, raw: bytes) -> str:
+        return self.unescape(raw.decode("utf-8", errors="replace"))
+
+
+# files of unknown formats; only ASCII URLs with common top-level domains
+generic = Extractor(url_regex.pattern)
+
+markdown = Extractor(
+    _link(r"<>\[\]{}\"'`*|\\"),
+    skip=[
+        # fenced code blocks, indented by at most three spaces; unterminated ones run
+        # to the end of the file
+        r"```"
+        + _line_start("```")
+        + r"(?P<fence>`*)[^`\n]*\n(?:[^\n]*\n)*?"
+        + r"(?:[ \t]*```(?P=fence)[ \t]*$|[^\n]*\Z)",
+        r"~~~"
+        + _line_start("~~~")
+        + r"(?P<fence>~*)[^\n]*\n(?:[^\n]*\n)*?"
+        + r"(?:[ \t]*~~~(?P=fence)[ \t]*$|[^\n]*\Z)",
+        # HTML comments aren't rendered
+        r"<!--(?s:.*?)-->",
+    ],
+    inline="`",
+    flags=re.MULTILINE,
+)
+
+restructuredtext = Extractor(
+    _link(r"<>\"'`|\\"),
+    skip=[
+        # code directives with their indented content
+        r"\n(?P<indent>[ \t]*)\.\.[ \t]+(?:code|code-block|sourcecode)::[^\n]*"
+        + r"(?:\n(?P=indent)[ \t]+[^\n]*|\n[ \t]*(?=\n))*",
+        # the heads of all other directives, such that their "::" isn't taken for
+        # the start of a literal block; their arguments are scanned
+        r"\n[ \t]*\.\.[ \t]+[-\w]+::",
+        # literal blocks
+        r"::[ \t]*\n(?:[ \t]*\n)+(?P<indent>[ \t]+)[^\n]*"
+        + r"(?:\n(?P=indent)[^\n]*|\n[ \t]*(?=\n))*",
+    ],
+    inline="``",
+)
+
+html = Extractor(
+    _link(r"<>\"'`"),
+    skip=[
+        r"<!--(?s:.*?)-->",
+        # the content of scripts and style sheets, but not the attributes of the tag,
+        # e.g., <script src="https://...">
+        r"<(?is:(?P<element>script|style)\b(?P<tag>[^>]*)>.*?</(?P=element)\s*>)",
+    ],
+    escapes={"&amp;": "&"},
+)
+
+latex = Extractor(
+    _link(r"{}\\\"'"),
+    skip=[
+        r"%(?<!\\%)[^\n]*",
+        r"\\begin\{(?P<env>verbatim|Verbatim|lstlisting|minted)\*?\}(?s:.*?)"
+        + r"\\end\{(?P=env)\*?\}",
+        r"\\verb\*?(?P<delim>[^\sA-Za-z*])[^\n]*?(?P=delim)",
+    ],
+)
+
+extractors = {
+    ".md": markdown,
+    ".markdown": markdown,
+    ".rst": restructuredtext,
+    ".rest": restructuredtext,
+    ".htm": html,
+    ".html": html,
+    ".xhtml": html,
+    ".tex": latex,
+    ".ltx": latex,
+    ".sty": latex,
+    ".cls": latex,
+}
+
+
+def extractor_for(path) -> Extractor:
+    # chosen by the file extension; the generic pattern for everything else
+    return extractors.get(os.path.splitext(str(path))[1].lower(), generic)
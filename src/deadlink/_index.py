@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import threading
+from pathlib import Path
+from typing import Callable, Mapping
+
+from ._extract import extractor_for
+from ._main import get_url_spans, map_file
+
+# Bumped whenever the extraction of URLs changes; older indexes are discarded.
+index_version = 4
+
+
+def default_index_path() -> Path:
+    import appdirs
+
+    return Path(appdirs.user_cache_dir()) / "deadlink" / "files.sqlite"
+
+
+# Remembers the URLs of every scanned file together with its modification time, size
+# and content hash. Files whose mtime and size haven't changed aren't read again;
+# files whose content hash hasn't changed aren't searched again. A file counts as
+# unchanged for incremental runs only once a run has passed with its current content.
+class FileIndex:
+    def __init__(self, path: str | Path | None = None):
+        path = default_index_path() if path is None else Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # files are scanned from a thread pool
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(str(path), check_same_thread=False)
+        # the files handed out since the index was opened
+        self._scanned = set()
+        (version,) = self._con.execute("PRAGMA user_version").fetchone()
+        if version != index_version:
+            self._con.execute("DROP TABLE IF EXISTS files")
+            self._con.execute(f"PRAGMA user_version = {index_version}")
+        self._con.execute(
+            "CREATE TABLE IF NOT EXISTS files "
+            "(path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, hash TEXT, spans TEXT, "
+            "passed INTEGER)"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        with self._lock:
+            self._con.commit()
+            self._con.close()
+
+    def get_url_spans(self, path: str) -> tuple[list[tuple], bool]:
+        # Returns the URLs in the file (with spans) and whether the file has changed
+        # since the last run that passed
+        key = os.path.realpath(path)
+        stat = os.stat(path)
+        with self._lock:
+            self._scanned.add(key)
+            row = self._con.execute(
+                "SELECT mtime, size, hash, spans, passed FROM files WHERE path = ?",
+                (key,),
+            ).fetchone()
+
+        if row is not None and row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return [tuple(item) for item in json.loads(row[3])], not row[4]
+
+        with map_file(path) as content:
+            digest = hashlib.blake2b(content, digest_size=16).hexdigest()
+            changed = row is None or row[2] != digest
+            if changed:
+                spans = get_url_spans(content, extractor_for(path))
+            else:
+                spans = [tuple(item) for item in json.loads(row[3])]
+
+        passed = not changed and bool(row[4])
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    digest,
+                    json.dumps(spans),
+                    passed,
+                ),
+            )
+        return spans, not passed
+
+    def mark_passed(self, failing: set[str]):
+        # Records that the run passed for all files scanned since the index was
+        # opened, except the `failing` ones (real paths)
+        with self._lock:
+            self._con.executemany(
+                "UPDATE files SET passed = 1 WHERE path = ?",
+                ((key,) for key in self._scanned - failing),
+            )
+
+
+def failing_files(
+    d: Mapping, occurrences, failing: list[str], is_allowed: Callable | None = None
+) -> set[str]:
+    # The real paths of the files with URLs of the `failing` categories, or with URLs
+    # that have no result at all, e.g., because the run was stopped early. URLs that
+    # `is_allowed` rejects were never checked and don't count.
+    passed = {
+        seq[0].url
+        for category, seqs in d.items()
+        if category not in failing
+        for seq in seqs
+    }
+    files = set()
+    for url in occurrences:
+        if url in passed or (is_allowed is not None and not is_allowed(url)):
+            continue
+        files.update(os.path.realpath(f) for f, *_ in occurrences[url])
+    return files
+
+
+def _git(*args) -> list[str]:
+    try:
+        out = subprocess.run(
+            ["git", *args], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"git {' '.join(args)} failed: {e.stderr.decode()}")
+    return [item for item in out.decode().split("\0") if item]
+
+
+def changed_files(ref: str) -> set[str]:
+    # Files that differ from the given git ref, including untracked ones
+    files = _git("diff", "--name-only", "--relative", "-z", ref, "--")
+    files += _git("ls-files", "--others", "--exclude-standard", "-z")
+    return {os.path.realpath(f) for f in files}
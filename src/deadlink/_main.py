@@ -1,35 +1,240 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
+import mmap
+import os
 import re
-import ssl
-from collections import namedtuple
+import shutil
+import tempfile
+import threading
+from array import array
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, contextmanager
+from functools import lru_cache
 from pathlib import Path
-from typing import Callable
-from urllib.parse import urlsplit, urlunsplit
-
-import appdirs
-import httpx
-import toml
-from rich.console import Console
-from rich.progress import track
-
-# https://regexr.com/3e6m0
-# make all groups non-capturing with ?:
-url_regex = re.compile(
-    r"http(?:s)?:\/\/.(?:www\.)?[-a-zA-Z0-9@:%._\+~#=]{2,256}\.[a-z]{2,6}\b(?:[-a-zA-Z0-9@:%_\+.~#?&/=]*)"
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Iterable,
 )
+from urllib.parse import urldefrag, urlsplit, urlunsplit
+
+from ._anchors import AnchorCache, is_checkable
+from ._extract import Extractor, extractor_for, generic
+from ._metrics import Metrics, timer
+from ._occurrences import OccurrenceIndex
+from ._resolver import Resolver
+from ._scheduler import (
+    HostScheduler,
+    HostSlots,
+    get_host,
+    interleave_by_host,
+    parse_retry_after,
+    retry_codes,
+)
+from ._urls import normalize_url
+
+# httpx, rich, toml and appdirs are imported where they're needed; the CLI is started
+# for every file by pre-commit hooks, and `deadlink --version` or a file without URLs
+# shouldn't pay for them.
+if TYPE_CHECKING:
+    import httpx
 
 Info = namedtuple("Info", ["status_code", "url"])
 
+# Pretend to be a browser <https://stackoverflow.com/a/31597823/353337>.
+# If we don't do this, sometimes we'll get a 403 where browsers don't (e.g.,
+# JSTOR).
+headers = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.182 Safari/537.36"
+}
 
-def _get_urls_from_file(path):
-    try:
-        with open(path) as f:
-            content = f.read()
-    except UnicodeDecodeError:
+
+def is_binary(content) -> bool:
+    # like git, consider files with a NUL byte in the first 8000 bytes binary
+    return b"\0" in content[:8000]
+
+
+def _count_newlines(content, start: int, end: int, chunk_size: int = 2**20) -> int:
+    if isinstance(content, bytes):
+        return content.count(b"\n", start, end)
+    # mmap has no count(); look at the content in chunks
+    return sum(
+        content[k : min(k + chunk_size, end)].count(b"\n")
+        for k in range(start, end, chunk_size)
+    )
+
+
+def get_url_spans(
+    content, extractor: Extractor | None = None
+) -> list[tuple[str, int, int, int, int]]:
+    # all URLs in `content` with their start and end byte offsets, line and column
+    # (1-based, in characters of UTF-8); the extractor of the file format, the
+    # generic one by default
+    if is_binary(content):
         return []
-    return url_regex.findall(content)
+    if extractor is None:
+        extractor = generic
+    out = []
+    line = 1
+    # the column at byte offset `pos`; counted from the previous URL on the same
+    # line, such that long lines aren't decoded again for every URL
+    pos = 0
+    column = 1
+    for start, end in extractor.finditer(content):
+        num_newlines = _count_newlines(content, pos, start)
+        if num_newlines > 0:
+            line += num_newlines
+            pos = content.rfind(b"\n", pos, start) + 1
+            column = 1
+        column += len(content[pos:start].decode("utf-8", errors="replace"))
+        pos = start
+        url = extractor.decode(content[start:end])
+        out.append((url, start, end, line, column))
+    return out
+
+
+@contextmanager
+def map_file(path):
+    # Memory-map the file such that even huge files don't have to be read into memory
+    # as a whole. Fall back to reading for files that can't be mapped (e.g., empty
+    # files).
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            mm = None
+
+        if mm is None:
+            yield f.read()
+        else:
+            with mm:
+                yield mm
+
+
+def _get_url_spans_from_file(path):
+    with map_file(path) as content:
+        return get_url_spans(content, extractor_for(path))
+
+
+async def _head_or_get(
+    client,
+    url: str,
+    timeout: float,
+    headers: dict[str, str],
+    scheduler: HostScheduler,
+    get_fallback_codes: Collection[int],
+):
+    import httpx
+
+    # Waiting for a free connection in the pool doesn't count towards the timeout;
+    # with many URLs, most of them are queued there at first.
+    timeout = httpx.Timeout(timeout, pool=None)
+    host = get_host(url)
+    if host not in scheduler.head_unsupported:
+        r = await client.head(
+            url, follow_redirects=False, timeout=timeout, headers=headers
+        )
+        if r.status_code not in get_fallback_codes:
+            return r
+
+    # Some servers don't handle HEAD requests properly. Try GET, but close the
+    # response right after the headers have arrived; the body is never downloaded.
+    async with client.stream(
+        "GET", url, follow_redirects=False, timeout=timeout, headers=headers
+    ) as r:
+        pass
+
+    # remember hosts where GET succeeds and HEAD doesn't
+    if r.status_code < 400:
+        scheduler.head_unsupported.add(host)
+
+    return r
+
+
+async def _fetch(
+    url: str,
+    client,
+    timeout: float,
+    scheduler: HostScheduler,
+    get_fallback_codes: Collection[int],
+) -> tuple[int, str | None]:
+    # A single request, retried if the host is rate-limiting. Returns the status code
+    # and the redirect location.
+    import ssl
+
+    import httpx
+
+    attempt = 0
+    while True:
+        dead_code = await scheduler.dead_host_code(url)
+        if dead_code is not None:
+            return dead_code, None
+        try:
+            async with scheduler.slot(url):
+                # the host may have been found dead in the meantime
+                dead_code = scheduler.dead.get(get_host(url))
+                if dead_code is not None:
+                    return dead_code, None
+                r = await _head_or_get(
+                    client, url, timeout, headers, scheduler, get_fallback_codes
+                )
+                retry_delay = None
+                if r.status_code in retry_codes:
+                    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+                    retry_delay = scheduler.retry_delay(url, attempt, retry_after)
+                else:
+                    scheduler.recover(url)
+        except httpx.TimeoutException:
+            scheduler.fail(url, 901)
+            return 901, None
+        except httpx.ConnectError:
+            scheduler.fail(url, 902)
+            return 902, None
+        except httpx.HTTPError:
+            return 902, None
+        except ssl.SSLCertVerificationError:
+            return 903, None
+        except Exception:
+            # Intercept all other errors
+            return 900, None
+
+        if retry_delay is None:
+            return r.status_code, r.headers.get("Location")
+
+        # rate-limited or temporarily unavailable; try again later
+        attempt += 1
+        await asyncio.sleep(retry_delay)
+
+
+# In-flight and completed requests. URLs that lead to the same request, e.g., because
+# they only differ in the fragment or in their spelling or because redirect chains
+# converge, share the result; every request is made only once. Without `keep_done`,
+# only in-flight requests are shared, e.g., by the runs of a long-running server whose
+# results expire.
+class RequestTable:
+    def __init__(self, keep_done: bool = True):
+        self._requests = {}
+        self.keep_done = keep_done
+
+    def cancel(self):
+        for request in self._requests.values():
+            request.cancel()
+
+    async def get(self, url: str, fetch: Callable):
+        key = normalize_url(url)
+        if key not in self._requests:
+            request = asyncio.ensure_future(fetch(url))
+            self._requests[key] = request
+            if not self.keep_done:
+                request.add_done_callback(lambda _: self._requests.pop(key, None))
+        # a waiter that's cancelled doesn't cancel the request for the others
+        return await asyncio.shield(self._requests[key])
 
 
 async def _get_return_code(
@@ -39,7 +244,18 @@ async def _get_return_code(
     follow_codes: list[int],
     max_num_redirects: int = 10,
     is_allowed: Callable | None = None,
+    scheduler: HostScheduler | None = None,
+    get_fallback_codes: Collection[int] = (),
+    request_table: RequestTable | None = None,
 ):
+    if scheduler is None:
+        scheduler = HostScheduler()
+    if request_table is None:
+        request_table = RequestTable()
+
+    def fetch(url):
+        return _fetch(url, client, timeout, scheduler, get_fallback_codes)
+
     k = 0
     seq = []
     while True:
@@ -47,42 +263,13 @@ async def _get_return_code(
             seq.append(Info(None, url))
             break
 
-        # Pretend to be a browser <https://stackoverflow.com/a/31597823/353337>.
-        # If we don't do this, sometimes we'll get a 403 where browsers don't (e.g.,
-        # JSTOR).
-        headers = {
-            "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.182 Safari/537.36"
-        }
-
-        try:
-            r = await client.head(
-                url, follow_redirects=False, timeout=timeout, headers=headers
-            )
-        except httpx.TimeoutException:
-            seq.append(Info(901, url))
-            break
-        except httpx.HTTPError:
-            seq.append(Info(902, url))
-            break
-        except ssl.SSLCertVerificationError:
-            seq.append(Info(903, url))
-            break
-        except Exception:
-            # Intercept all other errors
-            seq.append(Info(900, url))
-            break
-
-        seq.append(Info(r.status_code, url))
+        status_code, loc = await request_table.get(url, fetch)
+        seq.append(Info(status_code, url))
 
-        if (
-            k >= max_num_redirects
-            or r.status_code not in follow_codes
-            or "Location" not in r.headers
-        ):
+        if k >= max_num_redirects or status_code not in follow_codes or loc is None:
             break
 
         # Handle redirect
-        loc = r.headers["Location"]
         url_split = urlsplit(url)
 
         # create loc split that can be overridden
@@ -114,64 +301,437 @@ async def _get_return_code(
     return seq
 
 
-async def _get_all_return_codes(
-    urls,
-    timeout: float,
-    max_connections: int,
-    max_keepalive_connections: int,
-    follow_codes: list[int],
+async def _check_anchor(seq: list[Info], anchors: AnchorCache) -> list[Info]:
+    # Mark URLs whose fragment doesn't exist on the target page with a trailing 904
+    if categorize(seq) not in ["OK", "Successful permanent redirects"]:
+        return seq
+    url = seq[-1].url
+    if await anchors.has_anchor(url) is False:
+        seq = seq + [Info(904, url)]
+    return seq
+
+
+async def _iterate_in_thread(iterable):
+    # Consume a (blocking) iterator in a separate thread so that the event loop can
+    # already work on the items that have been produced.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                if stop.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+        loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+async def check_urls(
+    urls: Iterable[str] | AsyncIterable[str],
+    client: httpx.AsyncClient | None = None,
+    timeout: float = 10.0,
+    max_connections: int = 100,
+    max_keepalive_connections: int | None = None,
     is_allowed: Callable | None = None,
-):
-    # return await asyncio.gather(*map(_get_return_code, urls))
-    ret = []
-    limits = httpx.Limits(
-        max_keepalive_connections=max_keepalive_connections,
-        max_connections=max_connections,
-    )
-    async with httpx.AsyncClient(limits=limits) as client:
-        tasks = map(
-            lambda x: _get_return_code(
-                x, client, timeout, follow_codes=follow_codes, is_allowed=is_allowed
-            ),
-            urls,
+    max_connections_per_host: int | None = None,
+    host_delay: float = 0.0,
+    max_retries: int = 3,
+    retry_budget: float = 60.0,
+    get_fallback_codes: Collection[int] = (403, 404, 405),
+    check_anchors: bool = False,
+    fail_fast: bool = False,
+    time_budget: float | None = None,
+    keep_order: bool = False,
+    http2: bool = False,
+    max_host_failures: int | None = 3,
+    transport: httpx.AsyncBaseTransport | None = None,
+    event_hooks: dict | None = None,
+    scheduler: HostScheduler | None = None,
+    request_table: RequestTable | None = None,
+) -> AsyncIterator[list[Info]]:
+    """Checks the URLs and yields the redirect chain (a list of `Info`) of every URL
+    as soon as it is available.
+
+    `urls` can be a collection, a (blocking) iterator, which is consumed in a
+    thread, or an async iterator. URLs are checked while they are still being
+    produced. Pass an existing `client` to reuse its connection pool and settings;
+    `max_connections` still limits the number of requests in flight, the other
+    connection options are only used for a new client. A new client gets a
+    connection pool per host; the number of keep-alive connections per host is
+    derived from the number of URLs per host unless `max_keepalive_connections` is
+    given. `http2` requires the h2 package.
+
+    Concurrent checks can share a `scheduler` and a `request_table` such that the
+    limits per host apply to all of them and requests are made only once; the
+    scheduling options are only used for a new scheduler.
+
+    After `max_host_failures` consecutive connection failures or timeouts, the
+    remaining URLs of the host fail right away. A new client also looks up all
+    hosts up front, except those behind a proxy; URLs of hosts that don't exist fail
+    without a request.
+
+    With `fail_fast`, checking stops at the first URL in one of the error
+    categories; with `time_budget`, after the given number of seconds. All URLs that
+    haven't been checked then are yielded with the status code 905.
+    """
+    import httpx
+
+    from ._transport import EnvironmentProxies, HostPoolTransport, keepalive_per_host
+
+    # only follow permanent redirects
+    follow_codes = [
+        301,  # Moved Permanently
+        308,  # Permanent Redirect
+    ]
+    # Custom clients and transports may not connect to the hosts directly, so only
+    # look up the names for a new client, and only of the hosts it doesn't reach via a
+    # proxy. A shared scheduler is left to its owner.
+    own_scheduler = scheduler is None
+    if own_scheduler:
+        scheduler = HostScheduler(
+            max_connections_per_host,
+            host_delay,
+            max_retries,
+            retry_budget,
+            max_active=max_connections,
+            # HTTP/2 multiplexes all requests to a host over a single connection
+            fair_share=not http2,
+            max_failures=max_host_failures,
+            resolver=Resolver() if client is None and transport is None else None,
+            proxies=EnvironmentProxies(),
+        )
+    resolver = scheduler.resolver if own_scheduler else None
+    # the requests of a shared table may be awaited by other checks
+    own_requests = RequestTable() if request_table is None else None
+    request_table = request_table or own_requests
+
+    # keep as many connections per host open as it has URLs, up to its concurrency
+    keepalive = max_keepalive_connections
+    if keepalive is None and isinstance(urls, Collection):
+        keepalive = keepalive_per_host(urls, max_connections_per_host, http2)
+    if resolver is not None and isinstance(urls, Collection):
+        resolver.prefetch(
+            {
+                get_host(url)
+                for url in urls
+                if (is_allowed is None or is_allowed(url)) and scheduler.looks_up(url)
+            }
         )
-        for task in track(
-            asyncio.as_completed(tasks), description="Checking...", total=len(urls)
-        ):
-            ret.append(await task)
 
-    return ret
+    # Spread the requests over as many hosts as there are connections such that the
+    # connection pool isn't exhausted by a single host.
+    urls = _url_source(urls, None if keep_order else max_connections)
+
+    async with AsyncExitStack() as stack:
+        if client is None:
+            if transport is None:
+                transport = HostPoolTransport(
+                    max_connections_per_host,
+                    max_hosts=max_connections,
+                    keepalive=keepalive,
+                    http2=http2,
+                )
+            client = httpx.AsyncClient(transport=transport, event_hooks=event_hooks)
+            await stack.enter_async_context(client)
+
+        # Finished checks, the end of the URLs and the stop signal all arrive in
+        # this queue.
+        events = asyncio.Queue()
+        tasks = {}
+        anchors = AnchorCache(client, timeout, headers, scheduler)
+
+        def stop():
+            events.put_nowait(("stop", None))
+
+        async def check(url):
+            seq = await _get_return_code(
+                url,
+                client,
+                timeout,
+                follow_codes=follow_codes,
+                is_allowed=is_allowed,
+                scheduler=scheduler,
+                get_fallback_codes=get_fallback_codes,
+                request_table=request_table,
+            )
+            if check_anchors:
+                seq = await _check_anchor(seq, anchors)
+            if fail_fast and categorize(seq) in error_categories:
+                stop()
+            return seq
+
+        def add(url):
+            task = asyncio.ensure_future(check(url))
+            task.add_done_callback(done)
+            tasks[task] = url
+
+        # Only a limited number of checks runs at any time such that requests go out
+        # in the order of the URLs, e.g., the requests to a host stay close together.
+        # A host that has as many checks running as it may make requests doesn't hold
+        # up the URLs of other hosts behind it.
+        slots = HostSlots(2 * max_connections, max_connections_per_host, add)
+
+        def done(task):
+            slots.release(tasks[task])
+            events.put_nowait(("done", task))
+
+        producer = asyncio.ensure_future(_produce(urls, slots))
+        producer.add_done_callback(lambda _: events.put_nowait(("produced", None)))
+        budget = None
+        if time_budget is not None:
+            budget = asyncio.get_running_loop().call_later(time_budget, stop)
+
+        try:
+            async for seq in _finished(events, tasks, producer):
+                yield seq
+
+            # Stopped early. Cancel whatever is left; this closes open connections
+            # cleanly before the client is closed.
+            waiting = slots.close()
+            await _cancel_all([producer, *tasks], own_requests, anchors, resolver)
+            for seq in _unfinished(tasks, waiting, urls):
+                yield seq
+        finally:
+            if budget is not None:
+                budget.cancel()
+            slots.close()
+            await _cancel_all([producer, *tasks], own_requests, anchors, resolver)
+
+
+def _unfinished(tasks: dict, waiting: list[str], urls):
+    # The results of the checks that were running when checking stopped; URLs that
+    # were cancelled, waiting or not produced yet haven't been checked.
+    for task, url in tasks.items():
+        yield [Info(905, url)] if task.cancelled() else task.result()
+    for url in waiting:
+        yield [Info(905, url)]
+    if not hasattr(urls, "__aiter__"):
+        for url in urls:
+            yield [Info(905, url)]
+
+
+async def _finished(events: asyncio.Queue, tasks: dict, producer):
+    # Yields the results of the checks as they finish until all URLs have been
+    # produced and checked or until stopped
+    produced = False
+    while not produced or len(tasks) > 0:
+        kind, task = await events.get()
+        if kind == "stop":
+            return
+        if kind == "produced":
+            produced = True
+            if not producer.cancelled() and producer.exception() is not None:
+                raise producer.exception()
+        elif task in tasks:
+            del tasks[task]
+            yield task.result()
+
+
+def _url_source(urls, window: int | None):
+    # Collections become an iterator that's left at the first URL that hasn't been
+    # checked; what's left when stopping early is reported as not checked. Blocking
+    # iterators are consumed in a thread.
+    if isinstance(urls, Collection):
+        if window is not None:
+            urls = interleave_by_host(urls, window)
+        return iter(urls)
+    if hasattr(urls, "__aiter__"):
+        return urls
+    return _iterate_in_thread(urls)
+
+
+async def _produce(urls, slots: HostSlots):
+    # Offer every URL once there's a free slot. A plain iterator is left at the first
+    # URL that hasn't been offered.
+    if hasattr(urls, "__aiter__"):
+        async for url in urls:
+            await slots.available()
+            slots.offer(url)
+        return
+    while True:
+        await slots.available()
+        url = next(urls, None)
+        if url is None:
+            return
+        slots.offer(url)
+
+
+async def _cancel_all(
+    tasks: list,
+    request_table: RequestTable | None,
+    anchors: AnchorCache,
+    resolver: Resolver | None,
+):
+    for task in tasks:
+        task.cancel()
+    if request_table is not None:
+        request_table.cancel()
+    anchors.cancel()
+    if resolver is not None:
+        resolver.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
 
 def find_non_hidden_files(root):
-    root = Path(root)
-    if root.is_file():
-        if not root.name.startswith("."):
-            yield str(root)
-    else:
-        for path in root.glob("*"):
-            if not path.name.startswith("."):
-                if path.is_file():
-                    yield str(path)
+    root = os.path.normpath(root)
+    if os.path.isfile(root):
+        if not os.path.basename(root).startswith("."):
+            yield root
+    elif os.path.isdir(root):
+        with os.scandir(root) as it:
+            entries = list(it)
+        for entry in entries:
+            if not entry.name.startswith("."):
+                if entry.is_file():
+                    yield entry.path
                 else:
-                    yield from find_non_hidden_files(path)
+                    yield from find_non_hidden_files(entry.path)
 
 
 def find_files(paths: list[str]):
     return [filepath for path in paths for filepath in find_non_hidden_files(path)]
 
 
+def iter_url_spans(
+    files, max_workers: int | None = None, extract: Callable | None = None
+):
+    # Read files and extract URLs in a thread pool while the files are still being
+    # found. Only a limited number of files is in flight at any time. Yields the file
+    # name together with the URLs and their spans.
+    if max_workers is None:
+        max_workers = min(32, (os.cpu_count() or 1) + 4)
+    if extract is None:
+        extract = _get_url_spans_from_file
+    with ThreadPoolExecutor(max_workers) as executor:
+        pending = deque()
+        for f in files:
+            pending.append((f, executor.submit(extract, f)))
+            if len(pending) >= 4 * max_workers:
+                f, future = pending.popleft()
+                yield f, future.result()
+        while pending:
+            f, future = pending.popleft()
+            yield f, future.result()
+
+
+def iter_urls(files, max_workers: int | None = None):
+    for _, spans in iter_url_spans(files, max_workers):
+        for url, *_ in spans:
+            yield url
+
+
 def find_urls(files):
-    return set(url for f in files for url in _get_urls_from_file(f))
+    return set(iter_urls(files))
+
+
+def _unique(files):
+    # A file may be found under several paths, e.g., "docs" and "docs/a.md"; it's
+    # yielded only once.
+    found = set()
+    for f in files:
+        real = os.path.realpath(f)
+        if real not in found:
+            found.add(real)
+            yield f
+
+
+def scan_urls(
+    paths: list[str],
+    file_filter: Callable | None = None,
+    url_filter: Callable | None = None,
+    stats: Counter | None = None,
+    index=None,
+    changed_only: bool = False,
+    occurrences: OccurrenceIndex | None = None,
+    metrics: Metrics | None = None,
+):
+    # Yields every unique URL in the non-hidden files under `paths` as soon as it is
+    # found. Number of (ignored) files and URLs are counted in `stats`. If given,
+    # `occurrences` collects the file, span and position of every URL occurrence, and
+    # `metrics` the time spent finding files, extracting and filtering.
+    #
+    # With a file index, the URLs of unchanged files are taken from the index. If
+    # `changed_only` is set, unchanged files are skipped altogether.
+    if stats is None:
+        stats = Counter()
+
+    def extract_from_index(f):
+        spans, changed = index.get_url_spans(f)
+        if changed_only and not changed:
+            return []
+        return spans
 
+    extract = _get_url_spans_from_file if index is None else extract_from_index
+
+    def find(path):
+        if metrics is None:
+            return find_non_hidden_files(path)
+        return metrics.timed_iter("find files", find_non_hidden_files(path))
+
+    if metrics is not None:
+        extract = metrics.timed("extract URLs", extract)
+        if file_filter is not None:
+            file_filter = metrics.timed("filter files", file_filter)
+        if url_filter is not None:
+            url_filter = metrics.timed("filter URLs", url_filter)
+
+    def files():
+        for f in _unique(itertools.chain.from_iterable(map(find, paths))):
+            if file_filter is None or file_filter(f):
+                stats["files"] += 1
+                yield f
+            else:
+                stats["ignored files"] += 1
+
+    seen = set()
+    for f, spans in iter_url_spans(files(), extract=extract):
+        for url, start, end, line, column in spans:
+            if occurrences is None:
+                new = url not in seen
+                seen.add(url)
+            else:
+                # the index knows the URLs already
+                new = occurrences.add(url, f, start, end, line, column)
+            if not new:
+                continue
+            if url_filter is None or url_filter(url):
+                stats["urls"] += 1
+                yield url
+            else:
+                stats["ignored urls"] += 1
+
+
+def replace_in_string(
+    content: str, replacements: dict[str, str], extractor: Extractor | None = None
+):
+    # works for bytes, too, if `replacements` maps bytes to bytes; URLs are found
+    # like in `get_url_spans`
+    if extractor is None:
+        extractor = generic
 
-def replace_in_string(content: str, replacements: dict[str, str]):
     # register where to replace what
-    repl = [
-        (m.span(0), replacements[m.group(0)])
-        for m in url_regex.finditer(content)
-        if m.group(0) in replacements
-    ]
+    repl = []
+    for start, end in extractor.finditer(content):
+        url = extractor.unescape(content[start:end])
+        if url in replacements:
+            repl.append(((start, end), extractor.escape(replacements[url])))
 
     k0 = 0
     out = []
@@ -182,25 +742,103 @@ def replace_in_string(content: str, replacements: dict[str, str]):
         k0 = span[1]
     # and the rest
     out.append(content[k0:])
-    return "".join(out)
+    return content[:0].join(out)
 
 
 def replace_in_file(p, redirects: dict[str, str]):
     # read
-    try:
-        with open(p) as f:
-            content = f.read()
-    except UnicodeDecodeError:
+    with open(p, "rb") as f:
+        content = f.read()
+    if is_binary(content):
         return
-    # replace
-    new_content = replace_in_string(content, redirects)
+    # replace; operate on bytes to leave the file encoding untouched
+    redirects = {key.encode(): value.encode() for key, value in redirects.items()}
+    new_content = replace_in_string(content, redirects, extractor_for(p))
     # rewrite
     if new_content != content:
-        with open(p, "w") as f:
+        with open(p, "wb") as f:
             f.write(new_content)
 
 
+def replace_spans(content: bytes, spans) -> bytes:
+    # `spans` is a list of (start, end, old, new); all replacements are applied in a
+    # single pass. Spans that overlap an earlier one, e.g., the same span twice, are
+    # dropped.
+    out = []
+    k0 = 0
+    for start, end, _, new in sorted(spans):
+        if start < k0:
+            continue
+        out.append(content[k0:start])
+        out.append(new)
+        k0 = end
+    out.append(content[k0:])
+    return b"".join(out)
+
+
+def rewrite_file(p, spans, redirects: dict[str, str]):
+    with open(p, "rb") as f:
+        content = f.read()
+
+    extractor = extractor_for(p)
+    if all(
+        extractor.unescape(content[start:end]) == old for start, end, old, _ in spans
+    ):
+        new_content = replace_spans(
+            content,
+            [
+                (start, end, old, extractor.escape(new))
+                for start, end, old, new in spans
+            ],
+        )
+    else:
+        # the file has changed since it was scanned; find the URLs again
+        redirects = {key.encode(): value.encode() for key, value in redirects.items()}
+        new_content = replace_in_string(content, redirects, extractor)
+
+    if new_content == content:
+        return
+
+    # write to a temporary file next to the original, then swap atomically
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(p)))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(new_content)
+        shutil.copymode(p, tmp)
+        os.replace(tmp, p)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def rewrite_files(
+    occurrences: OccurrenceIndex,
+    redirects: dict[str, str],
+    max_workers: int | None = None,
+):
+    # Replace URLs in only those files in which they were found, in parallel. Files
+    # that were found under several names are rewritten once.
+    spans = {}
+    for url, new in redirects.items():
+        for f, start, end, *_ in occurrences.get(url, []):
+            spans.setdefault(os.path.realpath(f), set()).add(
+                (start, end, url.encode(), new.encode())
+            )
+
+    with ThreadPoolExecutor(max_workers) as executor:
+        futures = [
+            executor.submit(rewrite_file, f, s, redirects) for f, s in spans.items()
+        ]
+        for future in futures:
+            future.result()
+
+    return len(spans)
+
+
 def read_config():
+    import appdirs
+    import toml
+
     # check if there is a config file with more allowed/ignored domains
     config_file = Path(appdirs.user_config_dir()) / "deadlink" / "config.toml"
     try:
@@ -212,97 +850,329 @@ def read_config():
     return out
 
 
+def _is_literal(pattern: str) -> bool:
+    return not any(c in pattern for c in ".^$*+?{}[]\\|()")
+
+
+# Allow and ignore patterns compiled once. An item is allowed if it contains all allow
+# patterns and none of the ignore patterns. Patterns without special characters are
+# checked as plain substrings, all other ignore patterns are combined into one regex.
+class Matcher:
+    def __init__(self, allow: Iterable[str] = (), ignore: Iterable[str] = ()):
+        allow = sorted(set(allow))
+        ignore = sorted(set(ignore))
+        self.allow_literals = [p for p in allow if _is_literal(p)]
+        self.allow_regexes = [re.compile(p) for p in allow if not _is_literal(p)]
+        self.ignore_literals = [p for p in ignore if _is_literal(p)]
+        ignore_regexes = [re.compile(p) for p in ignore if not _is_literal(p)]
+        # Patterns with global flags like (?i) can't be combined, nor can patterns with
+        # groups, whose names may clash and whose numbers would change.
+        self.ignore_regexes = []
+        combine = []
+        for r in ignore_regexes:
+            if r.flags == re.UNICODE and r.groups == 0:
+                combine.append(r.pattern)
+            else:
+                self.ignore_regexes.append(r)
+        if combine:
+            self.ignore_regexes.append(
+                re.compile("|".join(f"(?:{p})" for p in combine))
+            )
+
+    def __call__(self, item: str) -> bool:
+        return (
+            all(p in item for p in self.allow_literals)
+            and all(r.search(item) is not None for r in self.allow_regexes)
+            and not any(p in item for p in self.ignore_literals)
+            and not any(r.search(item) is not None for r in self.ignore_regexes)
+        )
+
+
+@lru_cache(maxsize=32)
+def _get_matcher(allow: frozenset[str], ignore: frozenset[str]) -> Matcher:
+    return Matcher(allow, ignore)
+
+
 def is_allowed(item, allow_set: set[str], ignore_set: set[str]) -> bool:
-    is_allowed = True
+    return _get_matcher(frozenset(allow_set), frozenset(ignore_set))(item)
 
-    if is_allowed:
-        for a in allow_set:
-            if re.search(a, item) is None:
-                is_allowed = False
-                break
 
-    if is_allowed:
-        for i in ignore_set:
-            if re.search(i, item) is not None:
-                is_allowed = False
-                break
+# categories that make `deadlink check` fail
+error_categories = [
+    "Missing anchors",
+    "Client errors",
+    "Server errors",
+    "Timeouts",
+    "Other errors",
+]
 
-    return is_allowed
+categories = [
+    "OK",
+    "Missing anchors",
+    "Successful permanent redirects",
+    "Failing permanent redirects",
+    "Non-permanent redirects",
+    "Client errors",
+    "Server errors",
+    "Timeouts",
+    "Other errors",
+    "Other HTTP errors",
+    "SSL certificate errors",
+    "Ignored",
+    "Not checked",
+]
+
+
+def categorize(seq: list[Info]) -> str:
+    status_code = seq[0].status_code
+    if seq[-1].status_code == 904:
+        return "Missing anchors"
+    elif status_code is None:
+        return "Ignored"
+    elif 200 <= status_code < 300:
+        return "OK"
+    elif 300 <= status_code < 400:
+        if status_code in [301, 308]:
+            if seq[-1].status_code is not None and 200 <= seq[-1].status_code < 400:
+                return "Successful permanent redirects"
+            return "Failing permanent redirects"
+        return "Non-permanent redirects"
+    elif 400 <= status_code < 500:
+        return "Client errors"
+    elif 500 <= status_code < 600:
+        return "Server errors"
+    elif status_code == 900:
+        return "Other errors"
+    elif status_code == 901:
+        return "Timeouts"
+    elif status_code == 902:
+        return "Other HTTP errors"
+    elif status_code == 903:
+        return "SSL certificate errors"
+    elif status_code == 905:
+        return "Not checked"
+    raise RuntimeError(f"Unknown status code {status_code}")
+
+
+def _usable(
+    seq: list[Info] | None, is_allowed: Callable | None, check_anchors: bool
+) -> bool:
+    # whether a cached result can be used instead of checking the URL again
+    return not (
+        seq is None
+        # the filter may have changed since the result was stored
+        or (is_allowed is not None and not all(is_allowed(item.url) for item in seq))
+        # the anchor may not have been checked
+        or (check_anchors and is_checkable(urldefrag(seq[-1].url)[1]))
+    )
+
+
+def _skip_cached(
+    urls, cache, is_allowed: Callable | None, hit: Callable, check_anchors: bool = False
+):
+    for url in urls:
+        seq = cache.get(url)
+        if _usable(seq, is_allowed, check_anchors):
+            hit(seq)
+        else:
+            yield url
 
 
 def categorize_urls(
-    urls: set[str],
+    urls: Iterable[str],
     timeout: float = 10.0,
     max_connections: int = 100,
-    max_keepalive_connections: int = 10,
+    max_keepalive_connections: int | None = None,
     is_allowed: Callable | None = None,
+    cache=None,
+    max_connections_per_host: int | None = None,
+    host_delay: float = 0.0,
+    max_retries: int = 3,
+    retry_budget: float = 60.0,
+    get_fallback_codes: Collection[int] = (403, 404, 405),
+    check_anchors: bool = False,
+    on_result: Callable | None = None,
+    fail_fast: bool = False,
+    time_budget: float | None = None,
+    http2: bool = False,
+    max_host_failures: int | None = 3,
+    transport: httpx.AsyncBaseTransport | None = None,
+    metrics: Metrics | None = None,
+    workers: int = 1,
+    server: str | None = None,
+    compact: bool = False,
 ):
-    # only follow permanent redirects
-    follow_codes = [
-        301,  # Moved Permanently
-        308,  # Permanent Redirect
-    ]
-    r = asyncio.run(
-        _get_all_return_codes(
+    """Checks the URLs and returns a dictionary category -> list of redirect chains.
+    With `workers` > 1, the URLs are sharded by host across as many processes. With
+    `server`, the path of a unix socket, they're checked by `deadlink serve`.
+
+    With `compact`, the results stay in a compact store; the return value is a
+    read-only mapping category -> sequence of chains that are only built when
+    they're looked at.
+    """
+    check_kwargs = {
+        "timeout": timeout,
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "is_allowed": is_allowed,
+        "max_connections_per_host": max_connections_per_host,
+        "host_delay": host_delay,
+        "max_retries": max_retries,
+        "retry_budget": retry_budget,
+        "get_fallback_codes": get_fallback_codes,
+        "check_anchors": check_anchors,
+        "fail_fast": fail_fast,
+        "time_budget": time_budget,
+        "http2": http2,
+        "max_host_failures": max_host_failures,
+        "transport": transport,
+    }
+    # Worker processes can't report to the metrics of this process; they only get
+    # the phase timings.
+    if metrics is not None and workers == 1:
+        check_kwargs["event_hooks"] = metrics.event_hooks()
+        if is_allowed is not None:
+            check_kwargs["is_allowed"] = metrics.timed("filter URLs", is_allowed)
+
+    from ._results import ResultStore
+
+    # Consult the result cache first, only check stale or unknown URLs. Cached
+    # results may come in from the scanning thread; new ones are collected separately
+    # in the event loop.
+    results = ResultStore()
+
+    def hit(seq):
+        results.append(seq)
+        if on_result is not None:
+            on_result(seq)
+
+    if cache is not None:
+        unknown = _skip_cached(
+            urls, cache, check_kwargs["is_allowed"], hit, check_anchors
+        )
+        urls = list(unknown) if isinstance(urls, Collection) else unknown
+
+    keep_order = False
+    if time_budget is not None and cache is not None:
+        # With limited time, check previously failing URLs first, then unknown ones,
+        # then the ones that have been stale for the longest time.
+        urls = sorted(urls, key=cache.priority)
+        keep_order = True
+
+    # Results arrive in the order in which they are finished; remember the order of
+    # the URLs to return the results in a deterministic order.
+    order = {}
+
+    def remember(urls, on_end):
+        for url in urls:
+            order.setdefault(url, len(order))
+            yield url
+        on_end(len(order))
+
+    async def check_all():
+        from rich.progress import Progress
+
+        new = ResultStore()
+        positions = array("I")
+        with Progress() as progress:
+            progress_task = progress.add_task("Checking...", total=None)
+
+            def set_total(total):
+                progress.update(progress_task, total=total)
+
+            if isinstance(urls, Collection):
+                checked = list(remember(urls, set_total))
+            else:
+                # URLs are still being discovered; the total is known only at the end.
+                checked = remember(urls, set_total)
+
+            seqs = _check_urls_with(
+                checked, workers, server, keep_order=keep_order, **check_kwargs
+            )
+            async for seq in seqs:
+                # report results as soon as they come in
+                progress.advance(progress_task)
+                if on_result is not None:
+                    on_result(seq)
+                new.append(seq)
+                positions.append(order[seq[0].url])
+        return new, positions
+
+    # Nothing to check, e.g., because the files don't contain any URLs or all results
+    # are cached; don't start the client.
+    urls = _nonempty(urls)
+    if urls is not None:
+        with timer(metrics, "check URLs"):
+            new, positions = asyncio.run(check_all())
+        # add the new results in the order of the URLs
+        for k in sorted(range(len(new)), key=positions.__getitem__):
+            seq = new[k]
+            if cache is not None:
+                cache.put(seq[0].url, seq)
+            results.append(seq)
+
+    # a dictionary category -> results, sorted by status code
+    return results.views() if compact else results.as_dict()
+
+
+def _check_urls_with(urls, workers: int, server: str | None, **kwargs):
+    # checks the URLs in this process, in worker processes, or on a server
+    if server is not None:
+        from ._server import check_urls_on_server
+
+        return check_urls_on_server(
             urls,
-            timeout,
-            max_connections,
-            max_keepalive_connections,
-            follow_codes,
-            is_allowed,
+            server,
+            **{
+                key: kwargs[key]
+                for key in ["is_allowed", "check_anchors", "fail_fast", "time_budget"]
+            },
         )
+    if workers > 1:
+        from ._workers import check_urls_in_workers
+
+        return check_urls_in_workers(urls, workers, **kwargs)
+    return check_urls(urls, **kwargs)
+
+
+def _nonempty(urls: Iterable[str]) -> Iterable[str] | None:
+    # None if there are no URLs; an iterator is advanced to see if there are any
+    if isinstance(urls, Collection):
+        return urls if len(urls) > 0 else None
+    urls = iter(urls)
+    first = next(urls, None)
+    return None if first is None else itertools.chain([first], urls)
+
+
+def _by_status_code(seqs):
+    # The views of compact results are sorted already. Ignored URLs have the status
+    # code None.
+    from ._results import ChainView
+
+    if isinstance(seqs, ChainView):
+        return seqs
+    return sorted(
+        seqs, key=lambda seq: -1 if seq[0].status_code is None else seq[0].status_code
     )
 
-    # sort results into dictionary
-    d = {
-        "OK": [],
-        "Successful permanent redirects": [],
-        "Failing permanent redirects": [],
-        "Non-permanent redirects": [],
-        "Client errors": [],
-        "Server errors": [],
-        "Timeouts": [],
-        "Other errors": [],
-        "Other HTTP errors": [],
-        "SSL certificate errors": [],
-        "Ignored": [],
-    }
-    for item in r:
-        status_code = item[0].status_code
-        if status_code is None:
-            d["Ignored"].append(item)
-        elif 200 <= status_code < 300:
-            d["OK"].append(item)
-        elif 300 <= status_code < 400:
-            if status_code in [301, 308]:
-                if 200 <= item[-1].status_code < 400:
-                    d["Successful permanent redirects"].append(item)
-                else:
-                    d["Failing permanent redirects"].append(item)
-            else:
-                d["Non-permanent redirects"].append(item)
-        elif 400 <= status_code < 500:
-            d["Client errors"].append(item)
-        elif 500 <= status_code < 600:
-            d["Server errors"].append(item)
-        elif status_code == 900:
-            d["Other errors"].append(item)
-        elif status_code == 901:
-            d["Timeouts"].append(item)
-        elif status_code == 902:
-            d["Other HTTP errors"].append(item)
-        elif status_code == 903:
-            d["SSL certificate errors"].append(item)
-        else:
-            raise RuntimeError(f"Unknown status code {status_code}")
 
-    return d
+def _print_locations(console, occurrences, url: str, max_locations: int = 3):
+    locations = occurrences.get(url, [])
+    for f, _, _, line, column in locations[:max_locations]:
+        loc = f"{os.path.relpath(f)}:{line}:{column}"
+        console.print(f"      {loc}", style="dim", markup=False, highlight=False)
+    if len(locations) > max_locations:
+        more = plural(len(locations) - max_locations, "more location")
+        console.print(f"      ({more})", style="dim", highlight=False)
+
 
+def print_to_screen(d, occurrences: OccurrenceIndex | None = None):
+    # With `occurrences`, the files, lines and columns of failing URLs are shown.
+    d = {key: _by_status_code(value) for key, value in d.items()}
+    if all(len(value) == 0 for value in d.values()):
+        return
 
-def print_to_screen(d):
-    # sort by status code
-    for key, value in d.items():
-        d[key] = sorted(value, key=lambda x: x[0].status_code)
+    from rich.console import Console
 
     console = Console()
 
@@ -324,6 +1194,12 @@ def print_to_screen(d):
         num = len(d[key])
         console.print(f"{key} ({num})", style="white", highlight=False)
 
+    key = "Not checked"
+    if key in d and len(d[key]) > 0:
+        print()
+        num = len(d[key])
+        console.print(f"{key} ({num})", style="white", highlight=False)
+
     keycol = [
         ("Successful permanent redirects", "yellow"),
         ("Failing permanent redirects", "red"),
@@ -349,6 +1225,7 @@ def print_to_screen(d):
                     console.print(f"   → [dim]{sc}[/]: {item.url}", style=color)
 
     for key in [
+        "Missing anchors",
         "Client errors",
         "Server errors",
         "Timeouts",
@@ -362,11 +1239,17 @@ def print_to_screen(d):
         console.print(f"{key} ({len(d[key])}):", style="red", highlight=False)
         for item in d[key]:
             url = item[0].url
-            status_code = item[0].status_code
-            if item[0].status_code < 900:
+            status_code = (
+                item[-1].status_code
+                if key == "Missing anchors"
+                else item[0].status_code
+            )
+            if status_code < 900:
                 console.print(f"  [dim]{status_code}[/]: {url}", style="red")
             else:
                 console.print(f"  {url}", style="red")
+            if occurrences is not None:
+                _print_locations(console, occurrences, url)
 
 
 def plural(number: int, noun: str) -> str:
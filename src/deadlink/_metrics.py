@@ -0,0 +1,262 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# httpcore trace events -> steps of a request; connect includes the DNS lookup
+trace_steps = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "http11.send_request_headers": "send",
+    "http11.send_request_body": "send",
+    "http2.send_request_headers": "send",
+    "http2.send_request_body": "send",
+    "http11.receive_response_headers": "wait",
+    "http2.receive_response_headers": "wait",
+}
+
+step_names = ["queue", "connect", "tls", "send", "wait"]
+
+
+class HostMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.responses = 0
+        self.error_responses = 0
+        self.seconds = 0.0
+        self.steps = dict.fromkeys(step_names, 0.0)
+
+    @property
+    def errors(self) -> int:
+        # requests without a response failed, e.g., timed out
+        return self.requests - self.responses + self.error_responses
+
+    @property
+    def mean_latency(self) -> float:
+        return self.seconds / self.responses if self.responses > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "mean_latency": self.mean_latency,
+            "seconds": self.seconds,
+            "steps": self.steps,
+        }
+
+
+# Set as the "trace" extension of every request; httpcore calls it at the start and
+# end of every step of the request.
+class _RequestTrace:
+    def __init__(self, host: str):
+        # transports may rewrite the URL of the request; keep the original host
+        self.host = host
+        self.start = time.perf_counter()
+        # time spent waiting for a connection from the pool
+        self.steps = {"queue": None}
+        self._started = {}
+
+    async def __call__(self, event_name: str, info: dict):
+        now = time.perf_counter()
+        if self.steps["queue"] is None:
+            self.steps["queue"] = now - self.start
+        name, _, state = event_name.rpartition(".")
+        step = trace_steps.get(name)
+        if step is None:
+            return
+        if state == "started":
+            self._started[name] = now
+        elif name in self._started:
+            duration = now - self._started.pop(name)
+            self.steps[step] = self.steps.get(step, 0.0) + duration
+
+
+# Timing of the phases of a run and of all requests, aggregated by host. Phases
+# overlap since URLs are checked while files are still being scanned; the time of
+# phases that run in worker threads is summed over all threads.
+class Metrics:
+    def __init__(self):
+        self.phases = defaultdict(float)
+        self.hosts = defaultdict(HostMetrics)
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    @contextmanager
+    def timer(self, phase: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - t)
+
+    def timed(self, phase: str, func: Callable) -> Callable:
+        def wrapped(*args, **kwargs):
+            t = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - t)
+
+        return wrapped
+
+    def timed_iter(self, phase: str, iterable: Iterable):
+        # only the time spent producing the items is counted
+        it = iter(iterable)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                self.add(phase, time.perf_counter() - t)
+                return
+            self.add(phase, time.perf_counter() - t)
+            yield item
+
+    def event_hooks(self) -> dict:
+        async def on_request(request):
+            self.hosts[request.url.host].requests += 1
+            request.extensions["trace"] = _RequestTrace(request.url.host)
+
+        async def on_response(response):
+            trace = response.request.extensions.get("trace")
+            if not isinstance(trace, _RequestTrace):
+                return
+            host = self.hosts[trace.host]
+            host.responses += 1
+            if response.status_code >= 400:
+                host.error_responses += 1
+            host.seconds += time.perf_counter() - trace.start
+            for step, seconds in trace.steps.items():
+                host.steps[step] += seconds or 0.0
+
+        return {"request": [on_request], "response": [on_response]}
+
+    def to_dict(self) -> dict:
+        return {
+            "phases": dict(self.phases),
+            "hosts": {host: m.to_dict() for host, m in sorted(self.hosts.items())},
+        }
+
+    def write_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_prometheus(self, path: str):
+        # Prometheus text format, e.g., for the textfile collector of node_exporter
+        lines = [
+            "# HELP deadlink_phase_seconds Time spent in each phase of the run.",
+            "# TYPE deadlink_phase_seconds gauge",
+        ]
+        for phase, seconds in self.phases.items():
+            lines.append(f"deadlink_phase_seconds{{phase={_label(phase)}}} {seconds}")
+
+        per_host = [
+            ("requests", "counter", "Number of requests.", "requests"),
+            ("errors", "counter", "Number of failed requests.", "errors"),
+            ("request_seconds", "counter", "Total request time.", "seconds"),
+        ]
+        for name, kind, description, attr in per_host:
+            lines.append(f"# HELP deadlink_host_{name}_total {description}")
+            lines.append(f"# TYPE deadlink_host_{name}_total {kind}")
+            for host, m in sorted(self.hosts.items()):
+                value = getattr(m, attr)
+                lines.append(
+                    f"deadlink_host_{name}_total{{host={_label(host)}}} {value}"
+                )
+
+        lines += [
+            "# HELP deadlink_request_step_seconds_total Time spent in each step of "
+            + "all requests.",
+            "# TYPE deadlink_request_step_seconds_total counter",
+        ]
+        for step in step_names:
+            value = sum(m.steps[step] for m in self.hosts.values())
+            lines.append(
+                f"deadlink_request_step_seconds_total{{step={_label(step)}}} {value}"
+            )
+
+        # write atomically such that the collector never reads a partial file
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    def print_summary(self, num_hosts: int = 10):
+        from rich.console import Console
+        from rich.table import Table
+
+        console = Console()
+        print()
+        table = Table(title="Phases")
+        table.add_column("Phase")
+        table.add_column("Seconds", justify="right")
+        for phase, seconds in self.phases.items():
+            table.add_row(phase, f"{seconds:.3f}")
+        console.print(table)
+
+        if len(self.hosts) == 0:
+            return
+
+        table = Table(title="Request steps")
+        for step in step_names:
+            table.add_column(step, justify="right")
+        table.add_row(
+            *[
+                f"{sum(m.steps[step] for m in self.hosts.values()):.3f}"
+                for step in step_names
+            ]
+        )
+        console.print(table)
+
+        # the hosts that took the most time
+        hosts = sorted(self.hosts.items(), key=lambda item: -item[1].seconds)
+        table = Table(
+            title=f"Slowest hosts ({min(num_hosts, len(hosts))} of {len(hosts)})"
+        )
+        table.add_column("Host")
+        table.add_column("Requests", justify="right")
+        table.add_column("Errors", justify="right")
+        table.add_column("Mean latency [s]", justify="right")
+        for host, m in hosts[:num_hosts]:
+            table.add_row(host, str(m.requests), str(m.errors), f"{m.mean_latency:.3f}")
+        console.print(table)
+
+
+def _label(value: str) -> str:
+    value = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'"{value}"'
+
+
+@contextmanager
+def timer(metrics: Metrics | None, phase: str):
+    if metrics is None:
+        yield
+        return
+    with metrics.timer(phase):
+        yield
+
+
+def metrics_from_args(args) -> Metrics | None:
+    # Nothing is measured unless asked for
+    if not (args.stats or args.stats_json or args.stats_prometheus):
+        return None
+    return Metrics()
+
+
+def write_metrics(args, metrics: Metrics | None):
+    if metrics is None:
+        return
+    if args.stats:
+        metrics.print_summary()
+    if args.stats_json is not None:
+        metrics.write_json(args.stats_json)
+    if args.stats_prometheus is not None:
+        metrics.write_prometheus(args.stats_prometheus)
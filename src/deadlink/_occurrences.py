@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Mapping
+
+
+# Where every URL was found: the file, start and end byte offset, line and column
+# (1-based) of every occurrence in flat arrays, in the order in which they were found.
+# File names are stored only once. The occurrences of a URL are chained via `_next`
+# (-1 ends the chain), so looking them up doesn't require sorting all occurrences.
+# Read like a dictionary url -> [(file, start, end, line, column), ...].
+class OccurrenceIndex(Mapping):
+    def __init__(self):
+        self._url_ids = {}
+        self._file_ids = {}
+        self._files = []
+        self._file_refs = array("I")
+        self._starts = array("Q")
+        self._ends = array("Q")
+        self._lines = array("I")
+        self._columns = array("I")
+        self._next = array("i")
+        self._heads = array("i")
+        self._tails = array("i")
+
+    def add(self, url: str, f: str, start: int, end: int, line: int, column: int):
+        # Returns True if this is the first occurrence of `url`
+        k = len(self._next)
+        url_id = self._url_ids.get(url)
+        if url_id is None:
+            self._url_ids[url] = len(self._heads)
+            self._heads.append(k)
+            self._tails.append(k)
+        else:
+            self._next[self._tails[url_id]] = k
+            self._tails[url_id] = k
+
+        file_id = self._file_ids.get(f)
+        if file_id is None:
+            file_id = len(self._files)
+            self._files.append(f)
+            self._file_ids[f] = file_id
+
+        self._file_refs.append(file_id)
+        self._starts.append(start)
+        self._ends.append(end)
+        self._lines.append(line)
+        self._columns.append(column)
+        self._next.append(-1)
+        return url_id is None
+
+    def num_occurrences(self) -> int:
+        return len(self._next)
+
+    def __getitem__(self, url: str) -> list[tuple[str, int, int, int, int]]:
+        k = self._heads[self._url_ids[url]]
+        out = []
+        while k != -1:
+            out.append(
+                (
+                    self._files[self._file_refs[k]],
+                    self._starts[k],
+                    self._ends[k],
+                    self._lines[k],
+                    self._columns[k],
+                )
+            )
+            k = self._next[k]
+        return out
+
+    def __contains__(self, url) -> bool:
+        return url in self._url_ids
+
+    def __iter__(self):
+        return iter(self._url_ids)
+
+    def __len__(self) -> int:
+        return len(self._url_ids)
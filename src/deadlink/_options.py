@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import os
+
+from ._index import FileIndex, changed_files
+from ._main import Matcher
+
+
+def _get(args, d: dict, key: str, default):
+    # command-line arguments take precedence over the config file
+    value = getattr(args, key, None)
+    if value is not None:
+        return value
+    return d.get(key, default)
+
+
+def get_matcher(args, d: dict, kind: str) -> Matcher:
+    # allow/ignore lists from the command line and the config file, e.g.,
+    # `args.allow_urls` and `d["allow_urls"]` for kind "urls"
+    allow = set(getattr(args, f"allow_{kind}") or []) | set(d.get(f"allow_{kind}", []))
+    ignore = set(getattr(args, f"ignore_{kind}") or [])
+    ignore |= set(d.get(f"ignore_{kind}", []))
+    return Matcher(allow, ignore)
+
+
+def categorize_kwargs(args, d: dict) -> dict:
+    return {
+        "timeout": args.timeout,
+        "max_connections": args.max_connections,
+        "max_keepalive_connections": _get(args, d, "max_keepalive_connections", None),
+        "max_connections_per_host": _get(args, d, "max_connections_per_host", 10),
+        "host_delay": _get(args, d, "host_delay", 0.0),
+        "max_retries": _get(args, d, "max_retries", 3),
+        "retry_budget": _get(args, d, "retry_budget", 60.0),
+        "get_fallback_codes": _get(args, d, "get_fallback_codes", [403, 404, 405]),
+        "check_anchors": _get(args, d, "check_anchors", False),
+        "http2": _get(args, d, "http2", False),
+        "max_host_failures": _get(args, d, "max_host_failures", 3),
+        "workers": _get(args, d, "workers", 1),
+        "server": server_path(args),
+        "fail_fast": getattr(args, "fail_fast", False),
+        "time_budget": getattr(args, "time_budget", None),
+    }
+
+
+def server_path(args) -> str | None:
+    # `--server` without a path means the default socket
+    server = getattr(args, "server", None)
+    if server == "":
+        from ._server import default_socket_path
+
+        return str(default_socket_path())
+    return server
+
+
+def open_index(args, d: dict) -> FileIndex | None:
+    # The file index is kept whenever results are cached; incremental runs need it.
+    use_cache = d.get("cache", False) if args.cache is None else args.cache
+    if not (use_cache or args.incremental):
+        return None
+    return FileIndex()
+
+
+def since_filter(args):
+    if args.since is None:
+        return None
+    files = changed_files(args.since)
+    return lambda item: os.path.realpath(item) in files
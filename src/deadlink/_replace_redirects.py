@@ -1,64 +1,75 @@
-import random
-from pathlib import Path
+from collections import Counter
 
+from ._cache import cache_from_args
+from ._index import failing_files
 from ._main import (
     categorize_urls,
-    find_files,
-    find_urls,
-    is_allowed,
+    error_categories,
     plural,
     print_to_screen,
     read_config,
-    replace_in_file,
+    rewrite_files,
+    scan_urls,
 )
+from ._metrics import metrics_from_args, write_metrics
+from ._occurrences import OccurrenceIndex
+from ._options import categorize_kwargs, get_matcher, open_index, since_filter
 
 
 def replace_redirects(args):
-    # get non-hidden files in non-hidden directories
-    files = find_files(args.paths)
-
     d = read_config()
 
-    # filter files by allow-ignore-lists
-    allow_patterns = set() if args.allow_files is None else set(args.allow_files)
-    if "allow_files" in d:
-        allow_patterns = allow_patterns.union(set(d["allow_files"]))
-    ignore_patterns = set() if args.ignore_files is None else set(args.ignore_files)
-    if "ignore_files" in d:
-        ignore_patterns = ignore_patterns.union(set(d["ignore_files"]))
-
-    num_files_before = len(files)
-    files = set(
-        filter(lambda item: is_allowed(item, allow_patterns, ignore_patterns), files)
+    # filter files and URLs by allow-ignore-lists
+    is_allowed_file = get_matcher(args, d, "files")
+    is_allowed_url = get_matcher(args, d, "urls")
+    # only consider files that changed with respect to a git ref
+    is_changed = since_filter(args)
+
+    # get URLs from non-hidden files in non-hidden directories; they are checked
+    # while the files are still being scanned
+    stats = Counter()
+    occurrences = OccurrenceIndex()
+    metrics = metrics_from_args(args)
+    index = open_index(args, d)
+    urls = scan_urls(
+        args.paths,
+        lambda item: (is_changed is None or is_changed(item)) and is_allowed_file(item),
+        stats=stats,
+        index=index,
+        changed_only=args.incremental,
+        occurrences=occurrences,
+        metrics=metrics,
     )
-    num_ignored_files = num_files_before - len(files)
-
-    allow_patterns = set() if args.allow_urls is None else set(args.allow_urls)
-    if "allow_urls" in d:
-        allow_patterns = allow_patterns.union(set(d["allow_urls"]))
-    ignore_patterns = set() if args.ignore_urls is None else set(args.ignore_urls)
-    if "ignore_urls" in d:
-        ignore_patterns = ignore_patterns.union(set(d["ignore_urls"]))
-
-    urls = find_urls(files)
 
-    # Shuffle the urls. In case there's rate limiting (e.g., on github.com),
-    # different URLs are checked on every turn.
-    urls = list(urls)
-    random.shuffle(urls)
-
-    urls_str = plural(len(urls), "unique URL")
-    files_str = plural(len(files), "file")
-    ifiles_str = plural(num_ignored_files, "file")
+    cache = cache_from_args(args, d)
+    try:
+        d = categorize_urls(
+            urls,
+            is_allowed=is_allowed_url,
+            cache=cache,
+            metrics=metrics,
+            compact=True,
+            **categorize_kwargs(args, d),
+        )
+        if index is not None:
+            # files with redirects are considered again by the next incremental run
+            failing = failing_files(
+                d,
+                occurrences,
+                [*error_categories, "Not checked", "Successful permanent redirects"],
+            )
+            index.mark_passed(failing)
+    finally:
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
+
+    urls_str = plural(stats["urls"], "unique URL")
+    files_str = plural(stats["files"], "file")
+    ifiles_str = plural(stats["ignored files"], "file")
     print(f"Found {urls_str} in {files_str} (ignored {ifiles_str})")
-
-    d = categorize_urls(
-        urls,
-        args.timeout,
-        args.max_connections,
-        args.max_keepalive_connections,
-        lambda url: is_allowed(url, allow_patterns, ignore_patterns),
-    )
+    write_metrics(args, metrics)
 
     # only consider successful permanent redirects
     redirects = d["Successful permanent redirects"]
@@ -82,14 +93,7 @@ def replace_redirects(args):
     # create a dictionary from redirects
     replace = dict([(r[0].url, r[-1].url) for r in redirects])
 
-    for path in args.paths:
-        path = Path(path)
-        if path.is_dir():
-            for p in path.rglob("*"):
-                if p.is_file():
-                    replace_in_file(p, replace)
-        else:
-            assert path.is_file()
-            replace_in_file(path, replace)
+    # only touch the files in which the URLs were found
+    rewrite_files(occurrences, replace)
 
     return 0
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+from collections.abc import Mapping
+
+from .__about__ import __version__
+from ._main import Info, categorize, error_categories
+
+# categories reported as warnings in SARIF
+warning_categories = [
+    "Successful permanent redirects",
+    "Failing permanent redirects",
+    "Non-permanent redirects",
+    "Other HTTP errors",
+    "SSL certificate errors",
+]
+
+
+def _chain(seq: list[Info]) -> list[dict]:
+    return [{"status_code": item.status_code, "url": item.url} for item in seq]
+
+
+def _locations(occurrences: dict, url: str) -> list[dict]:
+    return [
+        {
+            "file": os.path.relpath(f),
+            "start": start,
+            "end": end,
+            "line": line,
+            "column": column,
+        }
+        for f, start, end, line, column in occurrences.get(url, [])
+    ]
+
+
+def _end_column(loc: dict) -> int:
+    # Columns count characters, the span is in bytes; what's between them is read
+    # from the file again. Only failing URLs are reported, so that's cheap.
+    try:
+        with open(loc["file"], "rb") as f:
+            f.seek(loc["start"])
+            raw = f.read(loc["end"] - loc["start"])
+    except OSError:
+        return loc["column"] + loc["end"] - loc["start"]
+    return loc["column"] + len(raw.decode("utf-8", errors="replace"))
+
+
+# Reporters get every result as soon as it is available via `result()` and the full
+# categorized results, together with the location of every URL, at the end via
+# `finish()`.
+class Reporter:
+    def result(self, seq: list[Info]):
+        pass
+
+    def finish(self, d: Mapping, occurrences: Mapping):
+        pass
+
+
+# One JSON object per line, written and flushed as soon as a URL has been checked
+class JSONLReporter(Reporter):
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "w")
+        # results from the cache arrive from the scanning thread
+        self._lock = threading.Lock()
+
+    def result(self, seq: list[Info]):
+        line = json.dumps(
+            {
+                "url": seq[0].url,
+                "category": categorize(seq),
+                "status_code": seq[0].status_code,
+                "chain": _chain(seq),
+            }
+        )
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def finish(self, d: Mapping, occurrences: Mapping):
+        self._file.close()
+
+
+class JUnitReporter(Reporter):
+    def __init__(self, path: str):
+        self.path = path
+
+    def finish(self, d: Mapping, occurrences: Mapping):
+        num_tests = sum(len(value) for value in d.values())
+        num_failures = sum(len(d[key]) for key in error_categories)
+        testsuites = ET.Element("testsuites")
+        testsuite = ET.SubElement(
+            testsuites,
+            "testsuite",
+            name="deadlink",
+            tests=str(num_tests),
+            failures=str(num_failures),
+        )
+        for key, seqs in d.items():
+            for seq in seqs:
+                testcase = ET.SubElement(
+                    testsuite, "testcase", classname=key, name=seq[0].url
+                )
+                locations = _locations(occurrences, seq[0].url)
+                if locations:
+                    testcase.set("file", locations[0]["file"])
+                    testcase.set("line", str(locations[0]["line"]))
+                if key in error_categories:
+                    failure = ET.SubElement(
+                        testcase,
+                        "failure",
+                        message=f"{key} ({seq[-1].status_code})",
+                    )
+                    failure.text = "\n".join(
+                        [f"{item.status_code}: {item.url}" for item in seq]
+                        + [
+                            f"{loc['file']}:{loc['line']}:{loc['column']}"
+                            for loc in locations
+                        ]
+                    )
+                elif key == "Ignored":
+                    ET.SubElement(testcase, "skipped")
+
+        ET.ElementTree(testsuites).write(
+            self.path, encoding="utf-8", xml_declaration=True
+        )
+
+
+class SARIFReporter(Reporter):
+    def __init__(self, path: str):
+        self.path = path
+
+    def finish(self, d: Mapping, occurrences: Mapping):
+        rules = []
+        results = []
+        for key in error_categories + warning_categories:
+            if len(d.get(key, [])) == 0:
+                continue
+            rule_id = key.lower().replace(" ", "-")
+            rules.append({"id": rule_id, "shortDescription": {"text": key}})
+            level = "error" if key in error_categories else "warning"
+            for seq in d[key]:
+                url = seq[0].url
+                chain = " → ".join(f"{item.status_code}: {item.url}" for item in seq)
+                results.append(
+                    {
+                        "ruleId": rule_id,
+                        "level": level,
+                        "message": {"text": f"{key}: {chain}"},
+                        "locations": [
+                            {
+                                "physicalLocation": {
+                                    "artifactLocation": {
+                                        "uri": loc["file"].replace(os.sep, "/")
+                                    },
+                                    "region": {
+                                        "startLine": loc["line"],
+                                        "startColumn": loc["column"],
+                                        "endColumn": _end_column(loc),
+                                        "byteOffset": loc["start"],
+                                        "byteLength": loc["end"] - loc["start"],
+                                    },
+                                }
+                            }
+                            for loc in _locations(occurrences, url)
+                        ],
+                    }
+                )
+
+        sarif = {
+            "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+            "version": "2.1.0",
+            "runs": [
+                {
+                    "tool": {
+                        "driver": {
+                            "name": "deadlink",
+                            "version": __version__,
+                            "informationUri": "https://github.com/nschloe/deadlink",
+                            "rules": rules,
+                        }
+                    },
+                    "results": results,
+                    "columnKind": "unicodeCodePoints",
+                }
+            ],
+        }
+        with open(self.path, "w") as f:
+            json.dump(sarif, f, indent=2, ensure_ascii=False)
+
+
+def reporters_from_args(args) -> list[Reporter]:
+    reporters = []
+    if args.jsonl is not None:
+        reporters.append(JSONLReporter(args.jsonl))
+    if args.junit is not None:
+        reporters.append(JUnitReporter(args.junit))
+    if args.sarif is not None:
+        reporters.append(SARIFReporter(args.sarif))
+    return reporters
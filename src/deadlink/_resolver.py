@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import asyncio
+import socket
+from typing import Iterable
+
+# getaddrinfo errors that say the name doesn't exist, as opposed to temporary failures
+_not_found = {socket.EAI_NONAME, getattr(socket, "EAI_NODATA", socket.EAI_NONAME)}
+
+
+async def _resolves(host: str) -> bool:
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        return e.errno not in _not_found
+    except (OSError, UnicodeError):
+        # let the request itself report the problem
+        return True
+    return True
+
+
+# Looks up every host only once; all URLs of a host share the result. With
+# `prefetch`, the lookups for all hosts run concurrently before the first request
+# to them goes out.
+class Resolver:
+    def __init__(self):
+        self._lookups = {}
+
+    def _lookup(self, host: str) -> asyncio.Future:
+        if host not in self._lookups:
+            self._lookups[host] = asyncio.ensure_future(_resolves(host))
+        return self._lookups[host]
+
+    def prefetch(self, hosts: Iterable[str]):
+        for host in hosts:
+            if host != "":
+                self._lookup(host)
+
+    def cancel(self):
+        for lookup in self._lookups.values():
+            lookup.cancel()
+
+    async def resolves(self, host: str) -> bool:
+        # False only if the host name definitely doesn't exist
+        if host == "":
+            return True
+        return await self._lookup(host)
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Mapping, Sequence
+
+from ._main import Info, categories, categorize
+
+_category_ids = {key: k for k, key in enumerate(categories)}
+
+
+# The redirect chains of all checked URLs in flat arrays. Chain k consists of the
+# status codes and URL ids in the range `starts[k]:starts[k + 1]`; a status code of -1
+# stands for None. Every URL is checked only once, but many URLs redirect to the same
+# target, e.g., a login page; redirect targets are stored only once. The category of
+# every chain is determined when it's added; the chains of a category are only
+# collected and sorted when they're looked at.
+class ResultStore:
+    def __init__(self):
+        self._target_ids = {}
+        self._urls = []
+        self._status_codes = array("h")
+        self._url_refs = array("I")
+        self._starts = array("I", [0])
+        self._categories = array("B")
+        self._views = None
+
+    def _add_url(self, url: str) -> int:
+        self._urls.append(url)
+        return len(self._urls) - 1
+
+    def _add_target(self, url: str) -> int:
+        k = self._target_ids.get(url)
+        if k is None:
+            k = self._add_url(url)
+            self._target_ids[url] = k
+        return k
+
+    def append(self, seq: list[Info]):
+        for k, item in enumerate(seq):
+            self._status_codes.append(
+                -1 if item.status_code is None else item.status_code
+            )
+            add = self._add_url if k == 0 else self._add_target
+            self._url_refs.append(add(item.url))
+        self._starts.append(len(self._status_codes))
+        self._categories.append(_category_ids[categorize(seq)])
+        self._views = None
+
+    def __len__(self) -> int:
+        return len(self._categories)
+
+    def __getitem__(self, k: int) -> list[Info]:
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("result index out of range")
+        return [
+            Info(None if code == -1 else code, self._urls[ref])
+            for code, ref in zip(
+                self._status_codes[self._starts[k] : self._starts[k + 1]],
+                self._url_refs[self._starts[k] : self._starts[k + 1]],
+            )
+        ]
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self[k]
+
+    def _indices(self, category: str) -> array:
+        # chain indices of all categories, each sorted by the first status code
+        if self._views is None:
+            buckets = [array("I") for _ in categories]
+            for k, c in enumerate(self._categories):
+                buckets[c].append(k)
+            first = self._status_codes
+            starts = self._starts
+            self._views = [
+                array("I", sorted(bucket, key=lambda k: first[starts[k]]))
+                for bucket in buckets
+            ]
+        return self._views[_category_ids[category]]
+
+    def category(self, category: str) -> ChainView:
+        return ChainView(self, category)
+
+    def views(self) -> CategoryMap:
+        return CategoryMap(self)
+
+    def as_dict(self) -> dict[str, list[list[Info]]]:
+        # a plain dictionary of lists, like `categorize_urls` always returned them
+        return {category: list(self.category(category)) for category in categories}
+
+
+# The chains of one category, sorted by status code, as a read-only list
+class ChainView(Sequence):
+    def __init__(self, store: ResultStore, category: str):
+        self._store = store
+        self._category = category
+
+    def __len__(self) -> int:
+        return len(self._store._indices(self._category))
+
+    def __getitem__(self, k):
+        indices = self._store._indices(self._category)
+        if isinstance(k, slice):
+            return [self._store[i] for i in indices[k]]
+        return self._store[indices[k]]
+
+    def __iter__(self):
+        for k in self._store._indices(self._category):
+            yield self._store[k]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+# The results as a read-only dictionary category -> chains, sorted by status code; the
+# chains of a category are only collected when it's looked at
+class CategoryMap(Mapping):
+    def __init__(self, store: ResultStore):
+        self.store = store
+
+    def __getitem__(self, category: str) -> ChainView:
+        if category not in _category_ids:
+            raise KeyError(category)
+        return self.store.category(category)
+
+    def __iter__(self):
+        return iter(categories)
+
+    def __len__(self) -> int:
+        return len(categories)
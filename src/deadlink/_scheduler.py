@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+# Status codes that indicate a transient condition worth retrying
+retry_codes = [
+    429,  # Too Many Requests
+    503,  # Service Unavailable
+]
+
+
+def get_host(url: str) -> str:
+    try:
+        host = urlsplit(url).hostname
+    except ValueError:
+        host = None
+    return "" if host is None else host
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    # Retry-After is either a number of seconds or an HTTP date
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+def interleave_by_host(urls, window: int | None = None) -> list[str]:
+    # Round-robin across hosts such that the first requests go to as many distinct
+    # hosts as possible, e.g., a1 a2 a3 b1 c1 -> a1 b1 c1 a2 a3. With `window`, only
+    # that many hosts take part at any time and the next host joins once one is done,
+    # e.g., a1 b1 a2 c1 a3 for window 2. This keeps the requests to a host close
+    # together such that its connections can be reused.
+    queues = defaultdict(deque)
+    for url in urls:
+        queues[get_host(url)].append(url)
+    waiting = deque(queues.values())
+    if window is None:
+        window = len(waiting)
+    active = deque()
+    out = []
+    while waiting or active:
+        while waiting and len(active) < window:
+            active.append(waiting.popleft())
+        queue = active.popleft()
+        out.append(queue.popleft())
+        if queue:
+            active.append(queue)
+    return out
+
+
+# Slots for the checks that run at any time: at most `total` in all and at most
+# `per_host` per host. The URLs of a host that has used up its slots wait in a queue
+# per host instead of taking slots that URLs of other hosts could use; waiting hosts
+# take turns as slots become free. `start` is called for every URL that gets a slot.
+class HostSlots:
+    def __init__(self, total: int, per_host: int | None, start):
+        self.free = total
+        self.per_host = float("inf") if per_host is None else per_host
+        self._start = start
+        self._running = defaultdict(int)
+        self._waiting = {}
+        self._freed = asyncio.Event()
+        self._closed = False
+
+    async def available(self):
+        # waits until a slot is free
+        while self.free == 0:
+            self._freed.clear()
+            await self._freed.wait()
+
+    def offer(self, url: str):
+        self._waiting.setdefault(get_host(url), deque()).append(url)
+        self._start_waiting()
+
+    def release(self, url: str):
+        host = get_host(url)
+        self._running[host] -= 1
+        if self._running[host] == 0:
+            del self._running[host]
+        self.free += 1
+        self._start_waiting()
+        self._freed.set()
+
+    def close(self) -> list[str]:
+        # Stops starting URLs; returns the ones that are still waiting.
+        self._closed = True
+        waiting = [url for queue in self._waiting.values() for url in queue]
+        self._waiting.clear()
+        return waiting
+
+    def _start_waiting(self):
+        # one URL per host at a time
+        progress = True
+        while progress and self.free > 0 and not self._closed:
+            progress = False
+            for host in list(self._waiting):
+                if self.free == 0:
+                    break
+                if self._running[host] >= self.per_host:
+                    continue
+                queue = self._waiting[host]
+                url = queue.popleft()
+                if len(queue) == 0:
+                    del self._waiting[host]
+                self._running[host] += 1
+                self.free -= 1
+                progress = True
+                self._start(url)
+
+
+# Limits the number of concurrent requests per host and optionally enforces a minimum
+# delay between the starts of two requests to the same host. Hosts that throttle get
+# their concurrency reduced and are paused for the requested time. `max_active` caps
+# the total number of requests in flight; it should match the size of the connection
+# pool, which gets very slow with many waiting requests.
+#
+# With `fair_share`, every host that has requests waiting or in flight gets at most
+# its share of `max_active`. With HTTP/1.1, every concurrent request needs its own
+# connection; if some hosts took more than their share, the pool would be full and
+# new requests to other hosts would have to close idle connections instead of
+# reusing them.
+#
+# After `max_failures` consecutive connection failures or timeouts, a host is
+# considered dead and all of its remaining URLs fail right away with the status code
+# of the last failure. The same happens for hosts whose name doesn't resolve if a
+# `resolver` is given, unless `proxies` sends the requests to them via a proxy, which
+# looks up the name itself.
+class HostScheduler:
+    def __init__(
+        self,
+        max_per_host: int | None = None,
+        delay: float = 0.0,
+        max_retries: int = 3,
+        retry_budget: float = 60.0,
+        backoff: float = 1.0,
+        max_active: int | None = None,
+        fair_share: bool = False,
+        max_failures: int | None = 3,
+        resolver=None,
+        proxies=None,
+    ):
+        self.max_per_host = max_per_host
+        self.delay = delay
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_active = max_active
+        self.fair_share = fair_share
+        self.max_failures = max_failures
+        self.resolver = resolver
+        self.proxies = proxies
+        # status code for all URLs of a dead host
+        self.dead = {}
+        self._failures = defaultdict(int)
+        self._semaphore = None
+        # number of requests waiting or in flight per host
+        self._pending = defaultdict(int)
+        self.deadline = time.monotonic() + retry_budget
+        self._active = defaultdict(int)
+        self._next_start = defaultdict(float)
+        self._limits = {}
+        self._conditions = {}
+        # hosts that answer GET, but not HEAD requests properly
+        self.head_unsupported = set()
+
+    def renew(self, retry_budget: float, forget_failures: bool = False):
+        # Starts a new retry budget, e.g., for the next run of a long-running server.
+        # With `forget_failures`, dead hosts get another chance.
+        self.deadline = max(self.deadline, time.monotonic() + retry_budget)
+        if forget_failures:
+            self.dead.clear()
+            self._failures.clear()
+
+    def limit(self, host: str) -> float:
+        limit = float("inf") if self.max_per_host is None else self.max_per_host
+        if self.fair_share and self.max_active is not None:
+            limit = min(limit, max(1, self.max_active // max(1, len(self._pending))))
+        return min(limit, self._limits.get(host, limit))
+
+    def retry_delay(
+        self, url: str, attempt: int, retry_after: float | None
+    ) -> float | None:
+        # Returns the time to wait before the next attempt, or None if the request
+        # shouldn't be retried anymore.
+        if attempt >= self.max_retries:
+            return None
+        # exponential backoff with jitter
+        delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        now = time.monotonic()
+        if now + delay > self.deadline:
+            return None
+
+        # Throttle the host: halve its concurrency and hold back all other requests
+        # to it until the delay has passed.
+        host = get_host(url)
+        self._limits[host] = max(1, min(self.limit(host), self._active[host]) // 2)
+        self._next_start[host] = max(self._next_start[host], now + delay)
+        return delay
+
+    def looks_up(self, url: str) -> bool:
+        # whether the host name of the URL is looked up before the request
+        if self.resolver is None:
+            return False
+        return self.proxies is None or self.proxies.proxy_for(url) is None
+
+    async def dead_host_code(self, url: str) -> int | None:
+        # The status code to report for the URL without a request if its host is
+        # dead, otherwise None.
+        host = get_host(url)
+        if host not in self.dead and self.looks_up(url):
+            if not await self.resolver.resolves(host):
+                # like a failed connection
+                self.dead[host] = 902
+        return self.dead.get(host)
+
+    def fail(self, url: str, status_code: int):
+        # a connection failure or timeout
+        host = get_host(url)
+        self._failures[host] += 1
+        if self.max_failures and self._failures[host] >= self.max_failures:
+            self.dead[host] = status_code
+
+    def recover(self, url: str):
+        # The host has answered. Additive increase after a successful request to a
+        # throttled host.
+        host = get_host(url)
+        self._failures.pop(host, None)
+        if host in self._limits:
+            self._limits[host] += 1
+            if (
+                self.max_per_host is not None
+                and self._limits[host] >= self.max_per_host
+            ):
+                del self._limits[host]
+
+    def _condition(self, host: str) -> asyncio.Condition:
+        if host not in self._conditions:
+            self._conditions[host] = asyncio.Condition()
+        return self._conditions[host]
+
+    async def acquire(self, host: str):
+        cond = self._condition(host)
+        async with cond:
+            await cond.wait_for(lambda: self._active[host] < self.limit(host))
+            self._active[host] += 1
+            now = time.monotonic()
+            start = max(now, self._next_start[host])
+            self._next_start[host] = start + self.delay
+
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except asyncio.CancelledError:
+                await self.release(host)
+                raise
+
+    async def release(self, host: str):
+        cond = self._condition(host)
+        async with cond:
+            self._active[host] -= 1
+            cond.notify_all()
+
+    @asynccontextmanager
+    async def _total_slot(self):
+        if self.max_active is None:
+            yield
+            return
+        if self._semaphore is None:
+            # created lazily inside the running event loop
+            self._semaphore = asyncio.Semaphore(self.max_active)
+        async with self._semaphore:
+            yield
+
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = get_host(url)
+        self._pending[host] += 1
+        try:
+            await self.acquire(host)
+            try:
+                # Wait for the per-host slot first such that requests to throttled
+                # hosts don't block others.
+                async with self._total_slot():
+                    yield
+            finally:
+                await self.release(host)
+        finally:
+            self._pending[host] -= 1
+            if self._pending[host] == 0:
+                del self._pending[host]
@@ -0,0 +1,351 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import signal
+import socket
+from collections import Counter
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterable
+
+from ._main import (
+    Info,
+    RequestTable,
+    _url_source,
+    _usable,
+    categorize,
+    check_urls,
+    error_categories,
+    read_config,
+)
+from ._scheduler import HostScheduler
+
+# A long-running checker that CLI runs on the same machine can submit their URLs to
+# over a unix socket. It keeps its connections open between runs and remembers the
+# results; URLs that another run is already waiting for are only checked once.
+#
+# The protocol consists of JSON lines. The client sends its options, e.g.,
+# `{"check_anchors": false}`, then one URL per line, and closes its end for writing.
+# The server sends back one redirect chain per URL, `[[status_code, url], ...]`, in
+# the order in which they're finished, and closes the connection.
+
+
+def default_socket_path() -> Path:
+    import appdirs
+
+    return Path(appdirs.user_cache_dir()) / "deadlink" / "server.sock"
+
+
+class CheckServer:
+    def __init__(self, client, cache=None, **check_kwargs):
+        self.client = client
+        self.cache = cache
+        self.check_kwargs = check_kwargs
+        # All runs share the limits per host and the requests in flight.
+        self.retry_budget = check_kwargs.get("retry_budget", 60.0)
+        self.scheduler = HostScheduler(
+            check_kwargs.get("max_connections_per_host"),
+            check_kwargs.get("host_delay", 0.0),
+            check_kwargs.get("max_retries", 3),
+            self.retry_budget,
+            max_active=check_kwargs.get("max_connections", 100),
+            fair_share=not check_kwargs.get("http2", False),
+            max_failures=check_kwargs.get("max_host_failures", 3),
+        )
+        self.request_table = RequestTable(keep_done=False)
+        # results of the URLs that are being checked, by URL and anchor checking
+        self._inflight = {}
+        self._runs = set()
+        self.stats = Counter()
+
+    def _submit(self, url: str, check_anchors: bool, todo: asyncio.Queue, deliver):
+        if self.cache is not None:
+            seq = self.cache.get(url)
+            if _usable(seq, None, check_anchors):
+                self.stats["cached"] += 1
+                deliver(seq)
+                return
+
+        key = (url, check_anchors)
+        future = self._inflight.get(key)
+        if future is None:
+            self.stats["checked"] += 1
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            todo.put_nowait(url)
+        else:
+            self.stats["shared"] += 1
+
+        def done(future):
+            deliver([Info(905, url)] if future.cancelled() else future.result())
+
+        future.add_done_callback(done)
+
+    async def _run(self, todo: asyncio.Queue, check_anchors: bool):
+        # Checks the URLs of one connection as they come in. Other connections may
+        # wait for them, too; the run continues if the client goes away.
+        taken = []
+
+        async def urls():
+            while True:
+                url = await todo.get()
+                if url is None:
+                    return
+                taken.append(url)
+                yield url
+
+        # hosts that were dead in earlier runs get another chance once the server has
+        # been idle
+        self.scheduler.renew(self.retry_budget, forget_failures=len(self._runs) <= 1)
+        try:
+            async for seq in check_urls(
+                urls(),
+                client=self.client,
+                check_anchors=check_anchors,
+                scheduler=self.scheduler,
+                request_table=self.request_table,
+                **self.check_kwargs,
+            ):
+                url = seq[0].url
+                if self.cache is not None:
+                    self.cache.put(url, seq)
+                self._inflight.pop((url, check_anchors)).set_result(seq)
+        finally:
+            if self.cache is not None:
+                self.cache.commit()
+            # whatever is left won't be checked
+            while not todo.empty():
+                taken.append(todo.get_nowait())
+            for url in taken:
+                future = self._inflight.pop((url, check_anchors), None)
+                if future is not None:
+                    future.cancel()
+
+    async def handle(self, reader, writer):
+        options = json.loads(await reader.readline() or "{}")
+        check_anchors = bool(options.get("check_anchors", False))
+        todo = asyncio.Queue()
+        results = asyncio.Queue()
+        run = asyncio.ensure_future(self._run(todo, check_anchors))
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+
+        num_submitted = 0
+
+        async def receive():
+            nonlocal num_submitted
+            try:
+                async for line in reader:
+                    self._submit(
+                        json.loads(line), check_anchors, todo, results.put_nowait
+                    )
+                    num_submitted += 1
+            finally:
+                todo.put_nowait(None)
+                # marks the end of the URLs
+                results.put_nowait(None)
+
+        receiver = asyncio.ensure_future(receive())
+        num_sent = 0
+        received_all = False
+        try:
+            while not received_all or num_sent < num_submitted:
+                seq = await results.get()
+                if seq is None:
+                    received_all = True
+                    continue
+                writer.write(json.dumps([list(item) for item in seq]).encode() + b"\n")
+                await writer.drain()
+                num_sent += 1
+        except ConnectionError:
+            # the client has stopped early
+            pass
+        finally:
+            receiver.cancel()
+            writer.close()
+
+    async def close(self):
+        for run in list(self._runs):
+            run.cancel()
+        self.request_table.cancel()
+        await asyncio.gather(*self._runs, return_exceptions=True)
+
+
+def _truncate(seq: list[Info], is_allowed: Callable | None) -> list[Info]:
+    # The server follows all redirects; apply the URL filter like a local check does.
+    if is_allowed is None:
+        return seq
+    for k, item in enumerate(seq[1:], start=1):
+        if not is_allowed(item.url):
+            return seq[:k] + [Info(None, item.url)]
+    return seq
+
+
+async def _send(urls, writer, is_allowed: Callable | None, pending: Counter, events):
+    # URLs that aren't allowed aren't sent to the server, but reported right away
+    async def send(url):
+        if is_allowed is not None and not is_allowed(url):
+            events.put_nowait(("ignored", [Info(None, url)]))
+            return
+        pending[url] += 1
+        writer.write(json.dumps(url).encode() + b"\n")
+        await writer.drain()
+
+    if hasattr(urls, "__aiter__"):
+        async for url in urls:
+            await send(url)
+    else:
+        for url in urls:
+            await send(url)
+    writer.write_eof()
+
+
+async def check_urls_on_server(
+    urls: Iterable[str],
+    path: str | Path | None = None,
+    is_allowed: Callable | None = None,
+    check_anchors: bool = False,
+    fail_fast: bool = False,
+    time_budget: float | None = None,
+) -> AsyncIterator[list[Info]]:
+    """Like `check_urls`, but the URLs are checked by a `deadlink serve` process
+    listening at the unix socket `path`. The URL filter, `fail_fast`, and
+    `time_budget` are applied here; all other options are the server's.
+    """
+    if path is None:
+        path = default_socket_path()
+    reader, writer = await asyncio.open_unix_connection(str(path), limit=2**24)
+    writer.write(json.dumps({"check_anchors": check_anchors}).encode() + b"\n")
+
+    urls = _url_source(urls, None)
+    events = asyncio.Queue()
+    # URLs that have been sent to the server, but haven't come back yet
+    pending = Counter()
+
+    async def receive():
+        async for line in reader:
+            events.put_nowait(("checked", [Info(*item) for item in json.loads(line)]))
+        events.put_nowait(("closed", None))
+
+    tasks = [
+        asyncio.ensure_future(_send(urls, writer, is_allowed, pending, events)),
+        asyncio.ensure_future(receive()),
+    ]
+    budget = None
+    if time_budget is not None:
+        budget = asyncio.get_running_loop().call_later(
+            time_budget, events.put_nowait, ("stop", None)
+        )
+    try:
+        while True:
+            kind, seq = await events.get()
+            if kind in ["closed", "stop"]:
+                break
+            if kind == "checked":
+                pending[seq[0].url] -= 1
+                seq = _truncate(seq, is_allowed)
+            yield seq
+            if fail_fast and categorize(seq) in error_categories:
+                break
+
+        # Done or stopped early; what hasn't come back hasn't been checked.
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for url, count in pending.items():
+            for _ in range(count):
+                yield [Info(905, url)]
+        if not hasattr(urls, "__aiter__"):
+            for url in urls:
+                yield [Info(905, url)]
+    finally:
+        if budget is not None:
+            budget.cancel()
+        for task in tasks:
+            task.cancel()
+        writer.close()
+
+
+def _listening(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(path))
+        except OSError:
+            return False
+    return True
+
+
+def serve(args) -> int:
+    import httpx
+
+    from ._cache import ResultCache, read_ttl
+    from ._options import categorize_kwargs
+    from ._transport import HostPoolTransport
+
+    d = read_config()
+    path = default_socket_path() if args.socket is None else Path(args.socket)
+    if path.exists():
+        if _listening(path):
+            print(f"A deadlink server is already listening at {path}.")
+            return 1
+        # left over from a server that didn't shut down cleanly
+        os.unlink(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    kwargs = categorize_kwargs(args, d)
+    # results are kept unless explicitly disabled
+    cache = None
+    if args.cache is not False:
+        cache = ResultCache(ttl=read_ttl(d), max_age=args.max_age)
+    check_kwargs = {
+        key: kwargs[key]
+        for key in [
+            "timeout",
+            "max_connections",
+            "max_connections_per_host",
+            "host_delay",
+            "max_retries",
+            "retry_budget",
+            "get_fallback_codes",
+            "max_host_failures",
+            "http2",
+        ]
+    }
+
+    async def main():
+        transport = HostPoolTransport(
+            kwargs["max_connections_per_host"],
+            max_hosts=kwargs["max_connections"],
+            keepalive=kwargs["max_keepalive_connections"],
+            http2=kwargs["http2"],
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            server = CheckServer(client, cache, **check_kwargs)
+            listener = await asyncio.start_unix_server(
+                server.handle, str(path), limit=2**24
+            )
+            print(f"Listening at {path}")
+            stopped = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signum in [signal.SIGINT, signal.SIGTERM]:
+                loop.add_signal_handler(signum, stopped.set)
+            try:
+                async with listener:
+                    await stopped.wait()
+            finally:
+                await server.close()
+                stats = server.stats
+                print(
+                    f"Served {sum(stats.values())} URLs: {stats['cached']} cached, "
+                    + f"{stats['shared']} shared, {stats['checked']} checked"
+                )
+
+    try:
+        asyncio.run(main())
+    finally:
+        if cache is not None:
+            cache.close()
+        if path.exists():
+            os.unlink(path)
+    return 0
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import ssl
+from collections import Counter, OrderedDict
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass_environment
+
+import httpx
+
+from ._scheduler import get_host
+
+
+class _TrackedStream(httpx.AsyncByteStream):
+    # Calls `on_close` once the response has been closed
+    def __init__(self, stream, on_close):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+# The proxies from HTTP_PROXY, HTTPS_PROXY, ALL_PROXY and NO_PROXY (or the system
+# settings), read once, like httpx uses them for clients without a custom transport
+class EnvironmentProxies:
+    def __init__(self):
+        self._proxies = getproxies()
+
+    def proxy_for(self, url: str) -> str | None:
+        # the URL of the proxy to send the request for `url` to, if any
+        parts = urlsplit(url)
+        proxy = self._proxies.get(parts.scheme) or self._proxies.get("all")
+        if not proxy or proxy_bypass_environment(parts.netloc, self._proxies):
+            return None
+        return proxy if "://" in proxy else f"http://{proxy}"
+
+
+# A connection pool per host instead of one shared pool. httpcore looks at every
+# connection in the pool for every request; with many hosts, a shared pool with many
+# connections costs more CPU time than the requests themselves. Separate pools also
+# never close the idle connections of one host to make room for another one.
+#
+# `keepalive` gives the number of connections to keep open per host, either for all
+# hosts or as a dictionary host -> number, e.g., derived from the number of URLs per
+# host; by default, all connections are kept. At most `max_hosts` pools are kept
+# around; the least recently used idle ones are closed. With `trust_env`, the pools
+# of hosts that are reached via a proxy from the environment connect to the proxy.
+class HostPoolTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        max_per_host: int | None = None,
+        max_hosts: int = 100,
+        keepalive: int | dict[str, int] | None = None,
+        http2: bool = False,
+        trust_env: bool = True,
+        **kwargs,
+    ):
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError(
+                    "HTTP/2 requires the h2 package; "
+                    + "install it with `pip install deadlink[http2]`"
+                )
+        self.max_per_host = max_per_host
+        self.max_hosts = max_hosts
+        self.keepalive = keepalive
+        self.http2 = http2
+        self.proxies = EnvironmentProxies() if trust_env else None
+        kwargs["trust_env"] = trust_env
+        # loading the certificates is expensive; share them between all pools
+        kwargs.setdefault("verify", httpx.create_ssl_context())
+        self._kwargs = kwargs
+        self._pools = OrderedDict()
+        self._active = Counter()
+
+    def __getstate__(self):
+        # Only the configuration is pickled, e.g., for worker processes; pools and the
+        # SSL context are set up anew.
+        state = self.__dict__.copy()
+        state["_kwargs"] = {
+            key: value
+            for key, value in self._kwargs.items()
+            if not isinstance(value, ssl.SSLContext)
+        }
+        state["_pools"] = OrderedDict()
+        state["_active"] = Counter()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._kwargs.setdefault("verify", httpx.create_ssl_context())
+
+    def _new_pool(
+        self, host: str, proxy: str | None = None
+    ) -> httpx.AsyncBaseTransport:
+        # HTTP/2 multiplexes all requests over one connection
+        keepalive = 1 if self.http2 else self.max_per_host
+        if isinstance(self.keepalive, dict):
+            keepalive = self.keepalive.get(host, keepalive)
+        elif self.keepalive is not None:
+            keepalive = self.keepalive
+        limits = httpx.Limits(
+            max_connections=self.max_per_host, max_keepalive_connections=keepalive
+        )
+        if proxy is not None:
+            kwargs = {**self._kwargs, "proxy": httpx.Proxy(proxy)}
+        else:
+            kwargs = self._kwargs
+        return httpx.AsyncHTTPTransport(limits=limits, http2=self.http2, **kwargs)
+
+    async def _close_idle_pools(self):
+        excess = len(self._pools) - self.max_hosts
+        for key in list(self._pools):
+            if excess <= 0:
+                break
+            if self._active[key] == 0 and key in self._pools:
+                del self._active[key]
+                await self._pools.pop(key).aclose()
+                excess -= 1
+
+    def _release(self, key):
+        self._active[key] -= 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = request.url
+        key = (url.scheme, url.host, url.port)
+        if key not in self._pools:
+            await self._close_idle_pools()
+            # another request may have created the pool in the meantime
+            if key not in self._pools:
+                proxy = None
+                if self.proxies is not None:
+                    proxy = self.proxies.proxy_for(str(url))
+                self._pools[key] = self._new_pool(url.host, proxy)
+        self._pools.move_to_end(key)
+
+        self._active[key] += 1
+        try:
+            response = await self._pools[key].handle_async_request(request)
+        except BaseException:
+            self._release(key)
+            raise
+        # the pool is busy until the response has been closed
+        response.stream = _TrackedStream(response.stream, lambda: self._release(key))
+        return response
+
+    async def aclose(self):
+        for pool in self._pools.values():
+            await pool.aclose()
+        self._pools.clear()
+
+
+def keepalive_per_host(
+    urls, max_per_host: int | None = None, http2: bool = False
+) -> dict[str, int]:
+    # Keep as many connections open as a host gets concurrent requests, or a single one
+    # with HTTP/2. Connections to hosts with a single URL aren't worth keeping.
+    counts = Counter(get_host(url) for url in urls)
+    per_host = 1 if http2 else max_per_host
+    return {
+        host: 0 if count == 1 else min(count, per_host or count)
+        for host, count in counts.items()
+    }
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+default_ports = {"http": 80, "https": 443}
+
+# characters that may be percent-encoded, but don't need to be (RFC 3986, 2.3)
+_unreserved = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_percent_regex = re.compile(r"%([0-9a-fA-F]{2})")
+
+
+def _normalize_percent_encoding(string: str) -> str:
+    def repl(m):
+        char = chr(int(m.group(1), 16))
+        return char if char in _unreserved else "%" + m.group(1).upper()
+
+    return _percent_regex.sub(repl, string)
+
+
+def normalize_url(url: str) -> str:
+    # A canonical form of the URL as it is sent to the server: case-folded scheme and
+    # host, no default port, normalized percent-encoding, no fragment. URLs with the
+    # same canonical form are equivalent (RFC 3986, 6.2.2 and 6.2.3).
+    try:
+        split = urlsplit(url)
+        port = split.port
+    except ValueError:
+        return url
+
+    scheme = split.scheme.lower()
+    host = split.hostname or ""
+    if ":" in host:
+        # IPv6
+        host = f"[{host}]"
+    netloc = host
+    if port is not None and port != default_ports.get(scheme):
+        netloc += f":{port}"
+    if split.username is not None or split.password is not None:
+        userinfo = split.netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{netloc}"
+
+    path = _normalize_percent_encoding(split.path) or "/"
+    query = _normalize_percent_encoding(split.query)
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+# characters that are allowed in URLs, but more likely end the sentence around them
+trailing_punctuation = ".:?!,;&"
+
+
+def trim_end(content, start: int, end: int) -> int:
+    # Returns the new end of the match content[start:end], e.g., the period in "See
+    # https://example.com." isn't part of the URL. Works for str and bytes.
+    trailing = trailing_punctuation
+    if not isinstance(content, str):
+        trailing = trailing.encode()
+    while end > start and content[end - 1 : end] in trailing:
+        end -= 1
+    return end
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import queue
+import threading
+import traceback
+from collections import Counter
+from typing import AsyncIterator, Collection, Iterable
+
+from ._main import Info, categorize, check_urls, error_categories
+from ._scheduler import get_host
+
+# URLs that are still being discovered are sent to the workers in batches of this
+# size; results are sent back at least this often (in seconds)
+batch_size = 256
+flush_interval = 0.1
+
+
+# Assigns every host to exactly one shard such that the limits per host hold across
+# all workers. New hosts go to the shard with the fewest URLs so far; if all URLs are
+# known up front, the hosts with the most URLs are distributed first.
+class Shards:
+    def __init__(self, num_shards: int, urls: Collection[str] | None = None):
+        self._hosts = {}
+        self._sizes = [0] * num_shards
+        if urls is not None:
+            counts = Counter(get_host(url) for url in urls)
+            for host, count in counts.most_common():
+                self._assign(host, count)
+
+    def _assign(self, host: str, size: int) -> int:
+        k = self._sizes.index(min(self._sizes))
+        self._hosts[host] = k
+        self._sizes[k] += size
+        return k
+
+    def __call__(self, url: str) -> int:
+        host = get_host(url)
+        k = self._hosts.get(host)
+        if k is None:
+            k = self._assign(host, 1)
+        return k
+
+
+def _feed(
+    urls,
+    inboxes: list,
+    pending: set,
+    stop: threading.Event,
+    streaming: bool,
+    errors: list,
+):
+    # Sends every URL to the worker of its host. Without `streaming`, i.e., for a
+    # collection of URLs, every worker gets its complete shard as one list. An error
+    # of the URL source is left in `errors` for the main loop to raise.
+    shard = Shards(len(inboxes), None if streaming else urls)
+    batches = [[] for _ in inboxes]
+    try:
+        for url in urls:
+            if stop.is_set():
+                return
+            k = shard(url)
+            pending.add(url)
+            batches[k].append(url)
+            if streaming and len(batches[k]) >= batch_size:
+                inboxes[k].put(batches[k])
+                batches[k] = []
+    except Exception as e:
+        errors.append(e)
+        return
+    for inbox, batch in zip(inboxes, batches):
+        inbox.put(batch)
+        inbox.put(None)
+
+
+async def _check_shard(inbox, outbox, streaming: bool, kwargs: dict):
+    loop = asyncio.get_running_loop()
+
+    async def receive():
+        while True:
+            batch = await loop.run_in_executor(None, inbox.get)
+            if batch is None:
+                return
+            for url in batch:
+                yield url
+
+    if streaming:
+        urls = receive()
+    else:
+        urls = await loop.run_in_executor(None, inbox.get)
+
+    results = []
+
+    def flush():
+        if results:
+            outbox.put(("results", results.copy()))
+            results.clear()
+
+    async def flush_periodically():
+        while True:
+            await asyncio.sleep(flush_interval)
+            flush()
+
+    flusher = asyncio.ensure_future(flush_periodically())
+    try:
+        async for seq in check_urls(urls, **kwargs):
+            results.append(seq)
+            if len(results) >= batch_size:
+                flush()
+    finally:
+        flusher.cancel()
+    flush()
+
+
+def _work(inbox, outbox, streaming: bool, kwargs: dict):
+    # entry point of the worker processes
+    try:
+        asyncio.run(_check_shard(inbox, outbox, streaming, kwargs))
+    except BaseException:
+        outbox.put(("error", traceback.format_exc()))
+    else:
+        outbox.put(("done", None))
+
+
+def _receive(outbox, timeout: float):
+    try:
+        return outbox.get(timeout=timeout)
+    except queue.Empty:
+        return "idle", None
+
+
+async def check_urls_in_workers(
+    urls: Iterable[str],
+    workers: int,
+    max_connections: int = 100,
+    fail_fast: bool = False,
+    time_budget: float | None = None,
+    **kwargs,
+) -> AsyncIterator[list[Info]]:
+    """Like `check_urls`, but the URLs are sharded by host across `workers`
+    processes with an event loop and a connection pool each. The connections are
+    split evenly between the workers. All arguments are sent to the workers and must
+    be picklable; a custom transport has to be picklable, too. Stopping early
+    (`fail_fast`, `time_budget`) is handled here, not in the workers.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    streaming = not isinstance(urls, Collection)
+    kwargs["max_connections"] = -(-max_connections // workers)
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue() for _ in range(workers)]
+    processes = [
+        ctx.Process(target=_work, args=(inbox, outbox, streaming, kwargs), daemon=True)
+        for inbox in inboxes
+    ]
+    for process in processes:
+        process.start()
+
+    # URLs that have been sent to a worker, but haven't come back yet. URLs that are
+    # still being discovered are sent from a thread.
+    pending = set()
+    stop = threading.Event()
+    errors = []
+    feeder = threading.Thread(
+        target=_feed,
+        args=(urls, inboxes, pending, stop, streaming, errors),
+        daemon=True,
+    )
+    if streaming:
+        feeder.start()
+    else:
+        _feed(urls, inboxes, pending, stop, streaming, errors)
+
+    loop = asyncio.get_running_loop()
+    deadline = None if time_budget is None else loop.time() + time_budget
+    num_done = 0
+    try:
+        while num_done < workers:
+            if errors:
+                # the workers won't get any more URLs
+                raise errors[0]
+            if deadline is not None and loop.time() > deadline:
+                break
+            kind, value = await loop.run_in_executor(None, _receive, outbox, 0.1)
+            if kind == "error":
+                raise RuntimeError(f"deadlink worker failed:\n{value}")
+            if kind == "done":
+                num_done += 1
+            elif kind == "idle":
+                if any(p.exitcode not in [None, 0] for p in processes):
+                    raise RuntimeError("deadlink worker died")
+            elif kind == "results":
+                failed = False
+                for seq in value:
+                    pending.discard(seq[0].url)
+                    failed = failed or categorize(seq) in error_categories
+                    yield seq
+                if fail_fast and failed:
+                    break
+        else:
+            return
+
+        # Stopped early. Everything that has been sent, but hasn't come back, hasn't
+        # been checked.
+        stop.set()
+        for process in processes:
+            process.terminate()
+        if feeder.is_alive():
+            await loop.run_in_executor(None, feeder.join)
+        for url in list(pending):
+            yield [Info(905, url)]
+    finally:
+        stop.set()
+        for inbox in inboxes:
+            # don't wait for URLs that no worker will ever read
+            inbox.cancel_join_thread()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
@@ -0,0 +1,52 @@
+import tempfile
+from pathlib import Path
+
+import deadlink
+from deadlink._cache import ResultCache
+from deadlink._main import Info
+
+
+def test_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "results.sqlite"
+        seq = [Info(301, "http://example.com"), Info(200, "https://example.com")]
+        with ResultCache(path) as cache:
+            assert cache.get("http://example.com") is None
+            cache.put("http://example.com", seq)
+            assert cache.get("http://example.com") == seq
+
+        # results persist across sessions
+        with ResultCache(path) as cache:
+            assert cache.get("http://example.com") == seq
+
+        # everything is stale with max_age=0
+        with ResultCache(path, max_age=0.0) as cache:
+            assert cache.get("http://example.com") is None
+
+        # timeouts expire with their own TTL
+        with ResultCache(path, ttl={"Timeouts": 0.0}) as cache:
+            cache.put("https://slow.com", [Info(901, "https://slow.com")])
+            assert cache.get("https://slow.com") is None
+
+
+def test_categorize_from_cache():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        url = "https://example.com"
+        with ResultCache(Path(tmpdir) / "results.sqlite") as cache:
+            cache.put(url, [Info(404, url)])
+            # no network access required
+            out = deadlink.categorize_urls({url}, cache=cache)
+        assert out["Client errors"] == [[Info(404, url)]]
+
+
+def test_priority():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with ResultCache(Path(tmpdir) / "results.sqlite") as cache:
+            cache.put("https://ok.com", [Info(200, "https://ok.com")])
+            cache.put("https://dead.com", [Info(404, "https://dead.com")])
+            urls = ["https://ok.com", "https://new.com", "https://dead.com"]
+            assert sorted(urls, key=cache.priority) == [
+                "https://dead.com",
+                "https://new.com",
+                "https://ok.com",
+            ]
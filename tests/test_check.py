@@ -1,6 +1,14 @@
+import asyncio
+import time
+
+import httpx
 import pytest
 
 import deadlink
+from deadlink._anchors import AnchorCache
+from deadlink._main import Info, RequestTable, _check_anchor, _get_return_code
+from deadlink._scheduler import HostScheduler
+from deadlink._transport import EnvironmentProxies
 
 
 @pytest.mark.parametrize(
@@ -40,3 +48,263 @@ def test_relative_redirect():
     url2 = "http://numpy-discussion.10968.n7.nabble.com/NEP-31-Context-local-and-global-overrides-of-the-NumPy-API-td47452.html#a47472"
     out = deadlink.categorize_urls({url})
     assert out["Successful permanent redirects"][0][-1].url == url2
+
+
+def test_get_fallback():
+    methods = []
+
+    def handler(request):
+        methods.append(request.method)
+        return httpx.Response(405 if request.method == "HEAD" else 200)
+
+    async def main():
+        scheduler = HostScheduler()
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [
+                await _get_return_code(
+                    url,
+                    client,
+                    1.0,
+                    [301, 308],
+                    scheduler=scheduler,
+                    get_fallback_codes=[405],
+                )
+                for url in ["https://a.com/1", "https://a.com/2"]
+            ]
+
+    seqs = asyncio.run(main())
+    assert seqs == [[Info(200, "https://a.com/1")], [Info(200, "https://a.com/2")]]
+    # the second URL goes straight to GET
+    assert methods == ["HEAD", "GET", "GET"]
+
+
+def test_check_anchors():
+    pages = []
+
+    def handler(request):
+        if request.method == "GET":
+            pages.append(str(request.url))
+        html = '<html><h1 id="intro">Intro</h1><a name="old-style"></a></html>'
+        return httpx.Response(200, html=html)
+
+    async def main():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            anchors = AnchorCache(client, 1.0, {}, HostScheduler())
+            return await asyncio.gather(
+                *[
+                    _check_anchor([Info(200, url)], anchors)
+                    for url in [
+                        "https://a.com/page#intro",
+                        "https://a.com/page#old-style",
+                        "https://a.com/page#missing",
+                        "https://a.com/page#!/route",
+                    ]
+                ]
+            )
+
+    seqs = asyncio.run(main())
+    assert [deadlink._main.categorize(seq) for seq in seqs] == [
+        "OK",
+        "OK",
+        "Missing anchors",
+        "OK",
+    ]
+    # the page is downloaded only once
+    assert pages == ["https://a.com/page"]
+
+
+def test_shared_requests():
+    requests = []
+
+    def handler(request):
+        requests.append(str(request.url))
+        if request.url.host in ["old.com", "other.com"]:
+            return httpx.Response(301, headers={"Location": "https://new.com/a"})
+        return httpx.Response(200)
+
+    urls = ["http://old.com/a", "http://old.com/a#frag", "http://other.com/a"]
+
+    async def main():
+        table = RequestTable()
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await asyncio.gather(
+                *[
+                    _get_return_code(url, client, 1.0, [301, 308], request_table=table)
+                    for url in urls
+                ]
+            )
+
+    seqs = asyncio.run(main())
+    assert seqs == [
+        [Info(301, "http://old.com/a"), Info(200, "https://new.com/a")],
+        [Info(301, "http://old.com/a#frag"), Info(200, "https://new.com/a#frag")],
+        [Info(301, "http://other.com/a"), Info(200, "https://new.com/a")],
+    ]
+    assert sorted(requests) == [
+        "http://old.com/a",
+        "http://other.com/a",
+        "https://new.com/a",
+    ]
+
+
+def _check_all(urls, handler, **kwargs):
+    async def main():
+        return [
+            seq
+            async for seq in deadlink.check_urls(
+                urls, timeout=1.0, transport=httpx.MockTransport(handler), **kwargs
+            )
+        ]
+
+    return asyncio.run(main())
+
+
+def test_streamed_hosts_interleave():
+    # URLs of a busy host don't hold up the hosts after them, even if the URLs are
+    # still being produced
+    starts = {}
+
+    async def handler(request):
+        starts.setdefault(request.url.host, time.monotonic() - t0)
+        if request.url.host == "a.com":
+            await asyncio.sleep(0.02)
+        return httpx.Response(200)
+
+    def urls():
+        yield from (f"https://a.com/{k}" for k in range(100))
+        yield from (f"https://b.com/{k}" for k in range(3))
+
+    t0 = time.monotonic()
+    seqs = _check_all(urls(), handler, max_connections=10, max_connections_per_host=2)
+    assert len(seqs) == 103
+    assert all(seq[0].status_code == 200 for seq in seqs)
+    assert starts["b.com"] < 0.2
+
+
+def test_fail_fast():
+    async def handler(request):
+        if request.url.path == "/dead":
+            return httpx.Response(404)
+        await asyncio.sleep(10.0)
+        return httpx.Response(200)
+
+    urls = ["https://a.com/dead"] + [f"https://b.com/{k}" for k in range(5)]
+    seqs = _check_all(urls, handler, fail_fast=True, keep_order=True)
+    categories = [deadlink._main.categorize(seq) for seq in seqs]
+    assert categories == ["Client errors"] + 5 * ["Not checked"]
+
+    # URLs that wait for a slot of their host aren't checked either
+    urls = [f"https://b.com/{k}" for k in range(5)] + ["https://a.com/dead"]
+    seqs = _check_all(urls, handler, fail_fast=True, max_connections_per_host=2)
+    categories = [deadlink._main.categorize(seq) for seq in seqs]
+    assert sorted(categories) == ["Client errors"] + 5 * ["Not checked"]
+
+
+def test_time_budget():
+    async def handler(request):
+        if request.url.path == "/slow":
+            await asyncio.sleep(10.0)
+        return httpx.Response(200)
+
+    seqs = _check_all(
+        ["https://a.com/fast", "https://a.com/slow"], handler, time_budget=0.2
+    )
+    assert sorted(deadlink._main.categorize(seq) for seq in seqs) == [
+        "Not checked",
+        "OK",
+    ]
+
+
+def test_external_client():
+    def handler(request):
+        return httpx.Response(404 if request.url.path == "/dead" else 200)
+
+    async def urls():
+        for url in ["https://a.com/ok", "https://a.com/dead"]:
+            yield url
+
+    async def main():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            # several runs share the client in one event loop
+            first = [seq async for seq in deadlink.check_urls(urls(), client)]
+            second = [seq async for seq in deadlink.check_urls(urls(), client)]
+            assert not client.is_closed
+        return first, second
+
+    first, second = asyncio.run(main())
+    expected = [[Info(200, "https://a.com/ok")], [Info(404, "https://a.com/dead")]]
+    assert sorted(first) == expected
+    assert sorted(second) == expected
+
+
+def test_dead_host():
+    num_requests = 0
+
+    def handler(request):
+        nonlocal num_requests
+        num_requests += 1
+        if request.url.host == "down.com":
+            raise httpx.ConnectTimeout("timed out")
+        return httpx.Response(200)
+
+    urls = [f"https://down.com/{k}" for k in range(10)] + ["https://up.com"]
+    seqs = _check_all(urls, handler, max_connections_per_host=1, max_host_failures=3)
+    assert [Info(200, "https://up.com")] in seqs
+    assert {seq[0].url for seq in seqs if seq[0].status_code == 901} == set(urls[:-1])
+    # the remaining URLs of the host fail without a request
+    assert num_requests == 3 + 1
+
+
+def test_unknown_host():
+    class Resolver:
+        async def resolves(self, host):
+            return host != "unknown.com"
+
+    def handler(request):
+        return httpx.Response(200)
+
+    async def main():
+        scheduler = HostScheduler(resolver=Resolver())
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return [
+                await _get_return_code(url, client, 1.0, [301], scheduler=scheduler)
+                for url in ["https://unknown.com", "https://known.com"]
+            ]
+
+    assert asyncio.run(main()) == [
+        [Info(902, "https://unknown.com")],
+        [Info(200, "https://known.com")],
+    ]
+
+
+def test_unknown_host_via_proxy(monkeypatch):
+    # the proxy looks up the names of the hosts behind it
+    for key in ["HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY"]:
+        monkeypatch.delenv(key, raising=False)
+        monkeypatch.delenv(key.lower(), raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:3128")
+    monkeypatch.setenv("NO_PROXY", "direct.com")
+
+    class Resolver:
+        async def resolves(self, host):
+            return False
+
+    def handler(request):
+        return httpx.Response(200)
+
+    async def main():
+        scheduler = HostScheduler(resolver=Resolver(), proxies=EnvironmentProxies())
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return [
+                await _get_return_code(url, client, 1.0, [301], scheduler=scheduler)
+                for url in ["https://internal.com", "https://direct.com"]
+            ]
+
+    assert asyncio.run(main()) == [
+        [Info(200, "https://internal.com")],
+        [Info(902, "https://direct.com")],
+    ]
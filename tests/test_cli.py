@@ -1,4 +1,8 @@
+from __future__ import annotations
+
 import pathlib
+import subprocess
+import sys
 
 import deadlink
 
@@ -7,3 +11,37 @@ def test_cli():
     this_dir = pathlib.Path(__file__).resolve().parent
     files = str((this_dir / ".." / "README.md").resolve())
     deadlink.cli(["check", files, "-a", "http", "-i", "xyz"])
+
+
+def _import_times(code: str) -> dict[str, int]:
+    # cumulative import time in microseconds per module, from `python -X importtime`
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+    )
+    times = {}
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_startup_time():
+    # The CLI runs for every file in pre-commit hooks; `--version` must not import
+    # the checking machinery.
+    code = "\n".join(
+        [
+            "import deadlink",
+            "try:",
+            "    deadlink.cli(['--version'])",
+            "except SystemExit:",
+            "    pass",
+        ]
+    )
+    times = _import_times(code)
+    heavy = ["httpx", "rich", "toml", "appdirs", "asyncio", "deadlink._main"]
+    assert [name for name in heavy if name in times] == []
+    assert times["deadlink"] < 50_000
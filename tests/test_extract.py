@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from deadlink._extract import extractor_for, generic
+from deadlink._main import get_url_spans, replace_in_string, rewrite_files, scan_urls
+from deadlink._occurrences import OccurrenceIndex
+
+
+def _urls(content: str, name: str) -> list[str]:
+    return [url for url, *_ in get_url_spans(content.encode(), extractor_for(name))]
+
+
+@pytest.mark.parametrize(
+    "name, content, ref",
+    [
+        (
+            "a.md",
+            "[Foo](https://en.wikipedia.org/wiki/Foo_(bar)) (see https://a.com/x).\n"
+            + "**https://example.museum** <https://bücher.example/ü>\n"
+            + "`https://inline.com` ```https://inline.com``` https://a.com/?a=1&b=2\n"
+            + "```sh\ncurl https://fenced.com\n```\n"
+            + "http://localhost:8000 [ref]: https://ref.com\n"
+            + "<!-- made with https://comment.com/-->",
+            [
+                "https://en.wikipedia.org/wiki/Foo_(bar)",
+                "https://a.com/x",
+                "https://example.museum",
+                "https://bücher.example/ü",
+                "https://a.com/?a=1&b=2",
+                "https://ref.com",
+            ],
+        ),
+        (
+            "a.rst",
+            "`Foo <https://foo.com/a>`_ and ``https://literal.com``, e.g.::\n\n"
+            + "    https://literal.com\n\n"
+            + ".. note::\n\n   https://note.com\n\n"
+            + ".. code-block:: sh\n\n   curl https://code.com\n\n"
+            + ".. image:: https://img.com/a.png\n",
+            ["https://foo.com/a", "https://note.com", "https://img.com/a.png"],
+        ),
+        (
+            "a.html",
+            '<a href="https://a.com/?x=1&amp;y=2">https://b.com</a>'
+            + "<!-- https://comment.com -->"
+            + '<script src="https://cdn.com/a.js">f("https://script.com")</script>',
+            ["https://a.com/?x=1&y=2", "https://b.com", "https://cdn.com/a.js"],
+        ),
+        (
+            "a.tex",
+            "\\url{https://a.com/a_b} \\href{https://b.com}{B}, 100\\% sure\n"
+            + "% https://comment.com\n"
+            + "\\verb|https://verb.com| https://c.com/a%20b",
+            ["https://a.com/a_b", "https://b.com", "https://c.com/a%20b"],
+        ),
+    ],
+)
+def test_extract(name, content, ref):
+    assert _urls(content, name) == ref
+    # str and bytes agree
+    extractor = extractor_for(name)
+    assert [
+        extractor.unescape(content[start:end])
+        for start, end in extractor.finditer(content)
+    ] == ref
+
+
+def test_fence_in_text():
+    # backticks in the middle of a line don't open a code block
+    content = "Wrap code in ``` fences.\nSee https://a.com/x.\n   ```\nhttps://c.com\n"
+    content += "   ```\nhttps://b.com/y\n"
+    assert _urls(content, "a.md") == ["https://a.com/x", "https://b.com/y"]
+
+
+def test_generic():
+    # files of unknown types keep the generic pattern
+    assert extractor_for("a.txt") is generic
+    assert _urls("`https://abc.com` https://def.com", "a.txt") == [
+        "https://abc.com",
+        "https://def.com",
+    ]
+
+
+def test_replace_html():
+    content = '<a href="http://a.com/?x=1&amp;y=2">http://b.com</a>'
+    new_content = replace_in_string(
+        content,
+        {"http://a.com/?x=1&y=2": "https://a.com/?x=1&y=2", "http://b.com": "x"},
+        extractor_for("a.html"),
+    )
+    assert new_content == '<a href="https://a.com/?x=1&amp;y=2">x</a>'
+
+
+def test_rewrite_files_markdown():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        a = tmpdir / "a.md"
+        a.write_text(
+            "[x](https://a.com/Foo_(bar))\n```\nhttps://a.com/Foo_(bar)\n```\n"
+        )
+        occurrences = OccurrenceIndex()
+        assert list(scan_urls([str(tmpdir)], occurrences=occurrences)) == [
+            "https://a.com/Foo_(bar)"
+        ]
+        rewrite_files(occurrences, {"https://a.com/Foo_(bar)": "https://a.com/b"})
+        # the URL in the code block is left alone
+        assert a.read_text() == (
+            "[x](https://a.com/b)\n```\nhttps://a.com/Foo_(bar)\n```\n"
+        )
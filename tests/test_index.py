@@ -0,0 +1,75 @@
+import os
+import tempfile
+from pathlib import Path
+
+from deadlink._index import FileIndex, failing_files
+from deadlink._main import Info, scan_urls
+from deadlink._occurrences import OccurrenceIndex
+
+
+def test_index():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        a = tmpdir / "a.md"
+        a.write_text("https://example.com/a\n")
+        with FileIndex(tmpdir / "files.sqlite") as index:
+            spans = [("https://example.com/a", 0, 21, 1, 1)]
+            assert index.get_url_spans(str(a)) == (spans, True)
+            # unchanged, but not passed yet
+            assert index.get_url_spans(str(a)) == (spans, True)
+            index.mark_passed(set())
+            assert index.get_url_spans(str(a)) == (spans, False)
+
+            # same content, new mtime: not considered changed
+            os.utime(a, ns=(0, 0))
+            assert index.get_url_spans(str(a)) == (spans, False)
+
+            a.write_text("https://example.com/b\n")
+            spans = [("https://example.com/b", 0, 21, 1, 1)]
+            assert index.get_url_spans(str(a)) == (spans, True)
+
+
+def test_scan_changed_only():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "docs").mkdir()
+        (tmpdir / "docs" / "a.md").write_text("https://example.com/a\n")
+        (tmpdir / "docs" / "b.md").write_text("https://example.com/b\n")
+        paths = [str(tmpdir / "docs")]
+        with FileIndex(tmpdir / "files.sqlite") as index:
+            urls = scan_urls(paths, index=index, changed_only=True)
+            assert sorted(urls) == ["https://example.com/a", "https://example.com/b"]
+            index.mark_passed(set())
+
+            (tmpdir / "docs" / "b.md").write_text("https://example.com/c\n")
+            urls = scan_urls(paths, index=index, changed_only=True)
+            assert list(urls) == ["https://example.com/c"]
+
+
+def test_scan_changed_only_failing():
+    # files with failing URLs are scanned again until they pass
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "a.md").write_text("https://example.com/dead\n")
+        (tmpdir / "b.md").write_text("https://example.com/ok\n")
+        paths = [str(tmpdir / "a.md"), str(tmpdir / "b.md")]
+        d = {
+            "OK": [[Info(200, "https://example.com/ok")]],
+            "Client errors": [[Info(404, "https://example.com/dead")]],
+        }
+        with FileIndex(tmpdir / "files.sqlite") as index:
+            occurrences = OccurrenceIndex()
+            urls = scan_urls(
+                paths, index=index, changed_only=True, occurrences=occurrences
+            )
+            assert sorted(urls) == [
+                "https://example.com/dead",
+                "https://example.com/ok",
+            ]
+            failing = failing_files(d, occurrences, ["Client errors"])
+            assert failing == {os.path.realpath(tmpdir / "a.md")}
+            index.mark_passed(failing)
+
+        with FileIndex(tmpdir / "files.sqlite") as index:
+            urls = scan_urls(paths, index=index, changed_only=True)
+            assert list(urls) == ["https://example.com/dead"]
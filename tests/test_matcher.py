@@ -0,0 +1,28 @@
+import pytest
+
+from deadlink._main import Matcher, is_allowed
+
+
+@pytest.mark.parametrize(
+    "item,allow,ignore,ref",
+    [
+        ("https://github.com/a", [], [], True),
+        ("https://github.com/a", ["https:"], [], True),
+        ("http://github.com/a", ["https:"], [], False),
+        # all allow patterns must match
+        ("https://github.com/a", ["https:", "gitlab"], [], False),
+        ("https://github.com/a", [], ["github"], False),
+        ("https://github.com/a", [], ["gitlab", r"github\.com/[a-z]$"], False),
+        ("https://github.com/ab", [], ["gitlab", r"github\.com/[a-z]$"], True),
+        # patterns with global flags can't be combined
+        ("https://GitHub.com", [], ["(?i)github", "gitlab.com"], False),
+        # nor can patterns with groups
+        ("https://a.com/v1/docs", [], [r"(?P<v>v\d)/docs", r"(?P<v>x)y"], False),
+        ("https://a.com/xy", [], [r"(?P<v>v\d)/docs", r"(?P<v>x)y", "c.com"], False),
+        ("https://a.com/bb", [], [r"(a)z", r"(b)\1"], False),
+        ("https://a.com/ab", [], [r"(a)z", r"(b)\1"], True),
+    ],
+)
+def test_matcher(item, allow, ignore, ref):
+    assert Matcher(allow, ignore)(item) == ref
+    assert is_allowed(item, set(allow), set(ignore)) == ref
@@ -0,0 +1,63 @@
+import tempfile
+from pathlib import Path
+
+import httpx
+
+import deadlink
+from deadlink._main import scan_urls
+from deadlink._metrics import Metrics
+
+
+def test_timers():
+    metrics = Metrics()
+    with metrics.timer("a"):
+        pass
+    assert metrics.timed("b", lambda x: 2 * x)(3) == 6
+    assert list(metrics.timed_iter("c", range(3))) == [0, 1, 2]
+    assert list(metrics.phases) == ["a", "b", "c"]
+
+
+def test_scan_phases():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        (Path(tmpdir) / "a.md").write_text("https://example.com")
+        metrics = Metrics()
+        urls = scan_urls(
+            [tmpdir],
+            file_filter=lambda f: True,
+            url_filter=lambda url: True,
+            metrics=metrics,
+        )
+        assert list(urls) == ["https://example.com"]
+    assert set(metrics.phases) == {
+        "find files",
+        "filter files",
+        "extract URLs",
+        "filter URLs",
+    }
+
+
+def test_hosts():
+    def handler(request):
+        if request.url.path == "/dead":
+            return httpx.Response(404)
+        return httpx.Response(200)
+
+    metrics = Metrics()
+    deadlink.categorize_urls(
+        ["https://aaa.com/ok", "https://aaa.com/dead", "https://bbb.com/ok"],
+        get_fallback_codes=(),
+        transport=httpx.MockTransport(handler),
+        metrics=metrics,
+    )
+    assert "check URLs" in metrics.phases
+    assert metrics.hosts["aaa.com"].requests == 2
+    assert metrics.hosts["aaa.com"].errors == 1
+    assert metrics.hosts["bbb.com"].requests == 1
+    assert metrics.hosts["bbb.com"].errors == 0
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "deadlink.prom"
+        metrics.write_prometheus(str(path))
+        lines = path.read_text().splitlines()
+    assert 'deadlink_host_requests_total{host="aaa.com"} 2' in lines
+    assert 'deadlink_host_errors_total{host="aaa.com"} 1' in lines
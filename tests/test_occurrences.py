@@ -0,0 +1,50 @@
+import tempfile
+from pathlib import Path
+
+from deadlink._main import Info, print_to_screen, scan_urls
+from deadlink._occurrences import OccurrenceIndex
+
+
+def test_occurrences():
+    occurrences = OccurrenceIndex()
+    assert occurrences.add("https://a.com", "a.md", 0, 13, 1, 1)
+    assert occurrences.add("https://b.com", "a.md", 20, 33, 2, 1)
+    assert not occurrences.add("https://a.com", "b.md", 5, 18, 1, 6)
+    assert not occurrences.add("https://a.com", "a.md", 40, 53, 3, 1)
+
+    assert len(occurrences) == 2
+    assert occurrences.num_occurrences() == 4
+    assert list(occurrences) == ["https://a.com", "https://b.com"]
+    # in the order in which they were found
+    assert occurrences["https://a.com"] == [
+        ("a.md", 0, 13, 1, 1),
+        ("b.md", 5, 18, 1, 6),
+        ("a.md", 40, 53, 3, 1),
+    ]
+    assert "https://c.com" not in occurrences
+    assert occurrences.get("https://c.com", []) == []
+    # file names are stored only once
+    assert occurrences._files == ["a.md", "b.md"]
+
+
+def test_scan_occurrences(capsys):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "a.txt").write_text(
+            "https://example.com/a\nsee https://example.com/b"
+        )
+        (tmpdir / "b.txt").write_text("https://example.com/b\n")
+        occurrences = OccurrenceIndex()
+        urls = sorted(scan_urls([str(tmpdir)], occurrences=occurrences))
+        assert urls == ["https://example.com/a", "https://example.com/b"]
+        assert sorted(occurrences["https://example.com/b"]) == [
+            (str(tmpdir / "a.txt"), 26, 47, 2, 5),
+            (str(tmpdir / "b.txt"), 0, 21, 1, 1),
+        ]
+
+        # dead links are shown with their locations
+        d = {"Client errors": [[Info(404, "https://example.com/b")]]}
+        print_to_screen(d, occurrences)
+    out = capsys.readouterr().out
+    assert "a.txt:2:5" in out
+    assert "b.txt:1:1" in out
@@ -1,9 +1,11 @@
 import tempfile
+from collections import Counter
 from pathlib import Path
 
 import pytest
 
 import deadlink
+from deadlink._occurrences import OccurrenceIndex
 
 
 def test_replace():
@@ -57,3 +59,65 @@ def test_fix_cli(content, ref):
             out = f.read()
 
         assert out == ref
+
+
+def test_replace_in_file_non_utf8():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        infile = Path(tmpdir) / "in.txt"
+        infile.write_bytes(b"caf\xe9 http://example.com\n")
+        deadlink._main.replace_in_file(
+            infile, {"http://example.com": "https://example.com"}
+        )
+        assert infile.read_bytes() == b"caf\xe9 https://example.com\n"
+
+
+def test_rewrite_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "a.txt").write_text("http://aaa.com http://bbb.com\nhttp://aaa.com\n")
+        (tmpdir / "b.txt").write_text("http://bbb.com\n")
+        (tmpdir / "c.txt").write_text("nothing\n")
+
+        occurrences = OccurrenceIndex()
+        urls = deadlink._main.scan_urls([str(tmpdir)], occurrences=occurrences)
+        assert sorted(urls) == ["http://aaa.com", "http://bbb.com"]
+
+        # b.txt changes after the scan
+        (tmpdir / "b.txt").write_text("see http://bbb.com\n")
+
+        num_files = deadlink._main.rewrite_files(
+            occurrences,
+            {"http://aaa.com": "https://aaa.com", "http://bbb.com": "https://bbb.com"},
+        )
+        assert num_files == 2
+        assert (tmpdir / "a.txt").read_text() == (
+            "https://aaa.com https://bbb.com\nhttps://aaa.com\n"
+        )
+        assert (tmpdir / "b.txt").read_text() == "see https://bbb.com\n"
+        assert sorted(p.name for p in tmpdir.iterdir()) == ["a.txt", "b.txt", "c.txt"]
+
+
+def test_rewrite_files_overlapping_paths():
+    # a file that is given both directly and via its directory is rewritten once
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "a.txt").write_text("http://aaa.com\n")
+
+        stats = Counter()
+        occurrences = OccurrenceIndex()
+        urls = deadlink._main.scan_urls(
+            [str(tmpdir), str(tmpdir / "a.txt")], stats=stats, occurrences=occurrences
+        )
+        assert list(urls) == ["http://aaa.com"]
+        assert stats["files"] == 1
+
+        deadlink._main.rewrite_files(occurrences, {"http://aaa.com": "https://aaa.com"})
+        assert (tmpdir / "a.txt").read_text() == "https://aaa.com\n"
+
+    assert (
+        deadlink._main.replace_spans(
+            b"http://aaa.com",
+            [(0, 14, b"", b"x"), (0, 14, b"", b"x"), (7, 14, b"", b"y")],
+        )
+        == b"x"
+    )
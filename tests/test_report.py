@@ -0,0 +1,88 @@
+import json
+import tempfile
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from deadlink._main import Info, categories, scan_urls
+from deadlink._occurrences import OccurrenceIndex
+from deadlink._report import JSONLReporter, JUnitReporter, SARIFReporter
+
+
+def _results():
+    ok = [Info(200, "https://example.com")]
+    dead = [Info(404, "https://example.com/dead")]
+    d = {key: [] for key in categories}
+    d["OK"].append(ok)
+    d["Client errors"].append(dead)
+    occurrences = {
+        "https://example.com/dead": [("a.md", 10, 34, 2, 5), ("b.md", 0, 24, 1, 1)]
+    }
+    return [ok, dead], d, occurrences
+
+
+def test_jsonl():
+    seqs, d, occurrences = _results()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "out.jsonl"
+        reporter = JSONLReporter(str(path))
+        reporter.result(seqs[0])
+        # results are available right away
+        assert json.loads(path.read_text())["category"] == "OK"
+        reporter.result(seqs[1])
+        reporter.finish(d, occurrences)
+        lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["status_code"] for line in lines] == [200, 404]
+
+
+def test_junit():
+    _, d, occurrences = _results()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "out.xml"
+        JUnitReporter(str(path)).finish(d, occurrences)
+        root = ET.parse(path).getroot()
+    testsuite = root.find("testsuite")
+    assert testsuite.get("tests") == "2"
+    assert testsuite.get("failures") == "1"
+    failing = [tc for tc in testsuite if tc.find("failure") is not None]
+    assert [(tc.get("file"), tc.get("line")) for tc in failing] == [("a.md", "2")]
+
+
+def test_sarif():
+    _, d, occurrences = _results()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = Path(tmpdir) / "out.sarif"
+        SARIFReporter(str(path)).finish(d, occurrences)
+        sarif = json.loads(path.read_text())
+    (result,) = sarif["runs"][0]["results"]
+    assert result["level"] == "error"
+    regions = [
+        (
+            loc["physicalLocation"]["artifactLocation"]["uri"],
+            loc["physicalLocation"]["region"]["startLine"],
+        )
+        for loc in result["locations"]
+    ]
+    assert regions == [("a.md", 2), ("b.md", 1)]
+
+
+def test_sarif_columns():
+    # columns count characters, and the region covers the URL as it's written
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        (tmpdir / "a.html").write_text(
+            'Café <a href="https://example.com/?a=1&amp;b=2">x</a>', encoding="utf-8"
+        )
+        occurrences = OccurrenceIndex()
+        (url,) = scan_urls([str(tmpdir)], occurrences=occurrences)
+        assert url == "https://example.com/?a=1&b=2"
+        d = {key: [] for key in categories}
+        d["Client errors"].append([Info(404, url)])
+        path = tmpdir / "out.sarif"
+        SARIFReporter(str(path)).finish(d, occurrences)
+        run = json.loads(path.read_text())["runs"][0]
+    assert run["columnKind"] == "unicodeCodePoints"
+    (loc,) = run["results"][0]["locations"]
+    region = loc["physicalLocation"]["region"]
+    assert region["startColumn"] == 15
+    assert region["endColumn"] == 15 + len("https://example.com/?a=1&amp;b=2")
+    assert region["byteOffset"] == 15
@@ -0,0 +1,66 @@
+import json
+
+import httpx
+
+from deadlink._main import Info, categories, categorize_urls, print_to_screen
+from deadlink._results import ResultStore
+
+
+def _store():
+    store = ResultStore()
+    store.append([Info(404, "https://a.com/dead")])
+    store.append([Info(301, "https://a.com/old"), Info(200, "https://a.com/new")])
+    store.append([Info(None, "https://ignored.com")])
+    store.append([Info(410, "https://b.com/gone")])
+    store.append([Info(308, "https://b.com/old"), Info(200, "https://a.com/new")])
+    store.append([Info(None, "https://ignored.com/2")])
+    return store
+
+
+def test_chains():
+    store = _store()
+    assert len(store) == 6
+    assert store[1] == [Info(301, "https://a.com/old"), Info(200, "https://a.com/new")]
+    assert store[-1] == [Info(None, "https://ignored.com/2")]
+    assert list(store)[0] == [Info(404, "https://a.com/dead")]
+    # redirect targets are stored only once
+    assert len(store._urls) == 7
+
+
+def test_categories():
+    d = _store().views()
+    assert list(d) == categories
+    assert d["Client errors"] == [
+        [Info(404, "https://a.com/dead")],
+        [Info(410, "https://b.com/gone")],
+    ]
+    assert len(d["Successful permanent redirects"]) == 2
+    assert d["Successful permanent redirects"][-1][0].url == "https://b.com/old"
+    assert d["OK"] == []
+    assert len(d.store) == 6
+    # a plain dictionary of lists on request
+    plain = d.store.as_dict()
+    assert isinstance(plain, dict) and plain == dict(d)
+    assert json.loads(json.dumps(plain))["Client errors"][0] == [
+        [404, "https://a.com/dead"]
+    ]
+    plain["OK"].append([Info(200, "https://c.com")])
+    # URLs without a status code can be sorted and printed
+    assert len(d["Ignored"]) == 2
+    print_to_screen(d)
+    print_to_screen(
+        {"Ignored": [[Info(None, "https://a.com")], [Info(None, "https://b.com")]]}
+    )
+
+
+def test_categorize_urls_compact():
+    urls = ["https://a.com/ok", "https://a.com/dead"]
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(404 if request.url.path == "/dead" else 200)
+    )
+    d = categorize_urls(urls, transport=transport, get_fallback_codes=())
+    assert isinstance(d, dict) and d["OK"] == [[Info(200, "https://a.com/ok")]]
+    # the compact results are only viewed
+    d = categorize_urls(urls, transport=transport, get_fallback_codes=(), compact=True)
+    assert not isinstance(d, dict) and len(d.store) == 2
+    assert d["Client errors"] == [[Info(404, "https://a.com/dead")]]
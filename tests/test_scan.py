@@ -0,0 +1,57 @@
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+from deadlink._main import find_files, scan_urls
+
+
+def _create_tree(tmpdir):
+    (tmpdir / "sub").mkdir()
+    (tmpdir / ".hidden").mkdir()
+    (tmpdir / "a.md").write_text("see https://example.com/a and http://foo.org")
+    (tmpdir / "sub" / "b.txt").write_text("https://example.com/a\n")
+    (tmpdir / "sub" / "c.svg").write_text("https://www.w3.org/2000/svg\n")
+    (tmpdir / ".hidden" / "d.txt").write_text("https://hidden.org\n")
+
+
+def test_find_files():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        _create_tree(tmpdir)
+        files = find_files([str(tmpdir)])
+        assert sorted(Path(f).relative_to(tmpdir).as_posix() for f in files) == [
+            "a.md",
+            "sub/b.txt",
+            "sub/c.svg",
+        ]
+
+
+def test_scan_urls():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        _create_tree(tmpdir)
+        stats = Counter()
+        urls = scan_urls(
+            [str(tmpdir)],
+            file_filter=lambda f: not f.endswith(".svg"),
+            url_filter=lambda url: "foo" not in url,
+            stats=stats,
+        )
+        assert list(urls) == ["https://example.com/a"]
+        assert stats == {
+            "files": 2,
+            "ignored files": 1,
+            "urls": 1,
+            "ignored urls": 1,
+        }
+
+
+def test_non_utf8():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        # a stray latin-1 byte doesn't hide the URLs
+        (tmpdir / "a.txt").write_bytes(b"caf\xe9 https://example.com/a\n")
+        # binary files are skipped
+        (tmpdir / "b.bin").write_bytes(b"\0\0https://example.com/b\n")
+        (tmpdir / "empty.txt").write_bytes(b"")
+        assert list(scan_urls([str(tmpdir)])) == ["https://example.com/a"]
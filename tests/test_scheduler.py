@@ -0,0 +1,123 @@
+import asyncio
+
+import httpx
+
+from deadlink._main import Info, _get_return_code
+from deadlink._scheduler import HostScheduler, interleave_by_host, parse_retry_after
+
+
+def test_interleave():
+    urls = [
+        "https://a.com/1",
+        "https://a.com/2",
+        "https://a.com/3",
+        "https://b.com/1",
+        "https://c.com/1",
+    ]
+    assert interleave_by_host(urls) == [
+        "https://a.com/1",
+        "https://b.com/1",
+        "https://c.com/1",
+        "https://a.com/2",
+        "https://a.com/3",
+    ]
+
+
+def test_interleave_window():
+    urls = ["https://a.com/1", "https://a.com/2", "https://a.com/3", "https://b.com/1"]
+    urls += ["https://c.com/1"]
+    assert interleave_by_host(urls, window=2) == [
+        "https://a.com/1",
+        "https://b.com/1",
+        "https://a.com/2",
+        "https://c.com/1",
+        "https://a.com/3",
+    ]
+
+
+def test_max_per_host():
+    scheduler = HostScheduler(max_per_host=2)
+    active = {"a.com": 0, "b.com": 0}
+    peak = {"a.com": 0, "b.com": 0}
+
+    async def request(url, host):
+        async with scheduler.slot(url):
+            active[host] += 1
+            peak[host] = max(peak[host], active[host])
+            await asyncio.sleep(0.01)
+            active[host] -= 1
+
+    async def main():
+        await asyncio.gather(
+            *[request(f"https://a.com/{k}", "a.com") for k in range(10)],
+            *[request(f"https://b.com/{k}", "b.com") for k in range(3)],
+        )
+
+    asyncio.run(main())
+    assert peak == {"a.com": 2, "b.com": 2}
+
+
+def test_max_active():
+    scheduler = HostScheduler(max_per_host=2, max_active=3)
+    active = 0
+    peak = 0
+
+    async def request(url):
+        nonlocal active, peak
+        async with scheduler.slot(url):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def main():
+        await asyncio.gather(
+            *[request(f"https://{host}.com/{k}") for host in "abc" for k in range(4)]
+        )
+
+    asyncio.run(main())
+    assert peak == 3
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+
+
+def test_retry_after():
+    num_requests = 0
+
+    def handler(request):
+        nonlocal num_requests
+        num_requests += 1
+        if num_requests < 3:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200)
+
+    async def main():
+        scheduler = HostScheduler(max_per_host=4, backoff=0.0)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await _get_return_code(
+                "https://a.com", client, 1.0, [301, 308], scheduler=scheduler
+            )
+
+    seq = asyncio.run(main())
+    assert seq == [Info(200, "https://a.com")]
+    assert num_requests == 3
+
+
+def test_retry_budget():
+    def handler(request):
+        return httpx.Response(429, headers={"Retry-After": "3600"})
+
+    async def main():
+        scheduler = HostScheduler(retry_budget=1.0)
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await _get_return_code(
+                "https://a.com", client, 1.0, [301, 308], scheduler=scheduler
+            )
+
+    # the requested delay exceeds the budget, so the 429 is reported right away
+    assert asyncio.run(main()) == [Info(429, "https://a.com")]
@@ -0,0 +1,99 @@
+import asyncio
+import tempfile
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from deadlink._cache import ResultCache
+from deadlink._main import Info
+from deadlink._server import CheckServer, check_urls_on_server
+
+
+def test_server():
+    num_requests = Counter()
+
+    async def handler(request):
+        num_requests[str(request.url)] += 1
+        await asyncio.sleep(0.01)
+        if request.url.path == "/old":
+            return httpx.Response(301, headers={"Location": "https://b.com/new"})
+        return httpx.Response(404 if request.url.path == "/dead" else 200)
+
+    async def check(urls, path, **kwargs):
+        return [seq async for seq in check_urls_on_server(urls, path, **kwargs)]
+
+    async def main(tmpdir):
+        path = Path(tmpdir) / "server.sock"
+        transport = httpx.MockTransport(handler)
+        with ResultCache(Path(tmpdir) / "cache.db") as cache:
+            async with httpx.AsyncClient(transport=transport) as client:
+                server = CheckServer(client, cache, get_fallback_codes=())
+                listener = await asyncio.start_unix_server(server.handle, str(path))
+                async with listener:
+                    first = [
+                        "https://a.com/1",
+                        "https://a.com/dead",
+                        "https://a.com/old",
+                    ]
+                    second = ["https://a.com/1", "https://a.com/old", "https://c.com"]
+                    # two runs at the same time, then one that's answered from the cache
+                    results = await asyncio.gather(
+                        check(first, path),
+                        check(second, path, is_allowed=lambda url: "b.com" not in url),
+                    )
+                    results.append(await check(first, path))
+                    await server.close()
+        return server.stats, results
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        stats, (first, second, third) = asyncio.run(main(tmpdir))
+
+    assert all(count == 1 for count in num_requests.values())
+    assert stats == {"checked": 4, "shared": 2, "cached": 3}
+    assert [Info(404, "https://a.com/dead")] in first
+    assert [Info(301, "https://a.com/old"), Info(200, "https://b.com/new")] in first
+    # the filter of the second run stops at the redirect target
+    assert [Info(301, "https://a.com/old"), Info(None, "https://b.com/new")] in second
+    assert sorted(third) == sorted(first)
+
+
+def test_server_shares_host_limits():
+    # the runs of all connections together make at most one request at a time to a
+    # host
+    active = Counter()
+    max_active = Counter()
+
+    async def handler(request):
+        host = request.url.host
+        active[host] += 1
+        max_active[host] = max(max_active[host], active[host])
+        await asyncio.sleep(0.01)
+        active[host] -= 1
+        return httpx.Response(200)
+
+    async def check(urls, path):
+        return [seq async for seq in check_urls_on_server(urls, path)]
+
+    async def main(tmpdir):
+        path = Path(tmpdir) / "server.sock"
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            server = CheckServer(client, max_connections_per_host=1)
+            listener = await asyncio.start_unix_server(server.handle, str(path))
+            async with listener:
+                results = await asyncio.gather(
+                    *(
+                        check([f"https://a.com/{k}/{j}" for j in range(5)], path)
+                        for k in range(3)
+                    )
+                )
+                await server.close()
+        return results
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        results = asyncio.run(main(tmpdir))
+
+    assert all(len(seqs) == 5 for seqs in results)
+    assert all(seq[0].status_code == 200 for seqs in results for seq in seqs)
+    assert max_active["a.com"] == 1
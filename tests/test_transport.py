@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+
+from deadlink._transport import HostPoolTransport, keepalive_per_host
+
+
+def test_keepalive_per_host():
+    urls = ["https://a.com/1", "https://a.com/2", "https://a.com/3", "https://b.com/1"]
+    assert keepalive_per_host(urls) == {"a.com": 3, "b.com": 0}
+    assert keepalive_per_host(urls, max_per_host=2) == {"a.com": 2, "b.com": 0}
+    assert keepalive_per_host(urls, max_per_host=2, http2=True) == {
+        "a.com": 1,
+        "b.com": 0,
+    }
+
+
+def test_env_proxies(monkeypatch):
+    for key in ["HTTP_PROXY", "HTTPS_PROXY", "ALL_PROXY", "NO_PROXY"]:
+        monkeypatch.delenv(key, raising=False)
+        monkeypatch.delenv(key.lower(), raising=False)
+    monkeypatch.setenv("HTTPS_PROXY", "proxy.example:3128")
+    monkeypatch.setenv("NO_PROXY", "b.com")
+    proxies = []
+
+    class MockPools(HostPoolTransport):
+        def _new_pool(self, host, proxy=None):
+            proxies.append((host, proxy))
+            return httpx.MockTransport(lambda request: httpx.Response(200))
+
+    async def main(transport):
+        async with httpx.AsyncClient(transport=transport) as client:
+            for url in ["https://a.com/1", "https://b.com/1", "http://c.com/1"]:
+                await client.head(url)
+
+    asyncio.run(main(MockPools()))
+    assert proxies == [
+        ("a.com", "http://proxy.example:3128"),
+        ("b.com", None),
+        ("c.com", None),
+    ]
+    # without trust_env, the environment is ignored
+    proxies.clear()
+    asyncio.run(main(MockPools(trust_env=False)))
+    assert all(proxy is None for _, proxy in proxies)
+    # real pools connect to the proxy
+    pool = HostPoolTransport()._new_pool("a.com", "http://proxy.example:3128")
+    assert type(pool._pool).__name__ == "AsyncHTTPProxy"
+
+
+def test_pool_per_host():
+    class MockPools(HostPoolTransport):
+        created = []
+        closed = []
+
+        def _new_pool(self, host, proxy=None):
+            self.created.append(host)
+            closed = self.closed
+
+            class Pool(httpx.MockTransport):
+                async def aclose(self):
+                    closed.append(host)
+
+            return Pool(lambda request: httpx.Response(200))
+
+    async def main():
+        transport = MockPools(max_hosts=2)
+        async with httpx.AsyncClient(transport=transport) as client:
+            for url in ["https://a.com/1", "https://a.com/2", "https://b.com/1"]:
+                await client.head(url)
+            # the least recently used pool is closed to make room for c.com
+            await client.head("https://c.com/1")
+            return transport
+
+    transport = asyncio.run(main())
+    assert transport.created == ["a.com", "b.com", "c.com"]
+    assert transport.closed == ["a.com", "b.com", "c.com"]
@@ -0,0 +1,38 @@
+import pytest
+
+from deadlink._main import get_url_spans, replace_in_string
+from deadlink._urls import normalize_url
+
+
+@pytest.mark.parametrize(
+    "url,ref",
+    [
+        ("https://Example.COM/a", "https://example.com/a"),
+        ("HTTPS://example.com:443/a", "https://example.com/a"),
+        ("http://example.com:80/a", "http://example.com/a"),
+        ("http://example.com:8080/a", "http://example.com:8080/a"),
+        ("https://example.com", "https://example.com/"),
+        ("https://example.com/a#section", "https://example.com/a"),
+        (
+            "https://example.com/%7euser/%2f?q=%3d",
+            "https://example.com/~user/%2F?q=%3D",
+        ),
+        ("https://user@Example.com/", "https://user@example.com/"),
+    ],
+)
+def test_normalize(url, ref):
+    assert normalize_url(url) == ref
+
+
+def test_trailing_punctuation():
+    content = b"See https://example.com/a. Or https://example.com/b: it's fine."
+    assert get_url_spans(content) == [
+        ("https://example.com/a", 4, 25, 1, 5),
+        ("https://example.com/b", 30, 51, 1, 31),
+    ]
+    new_content = replace_in_string(
+        content.decode(), {"https://example.com/a": "https://example.com/c"}
+    )
+    assert new_content == (
+        "See https://example.com/c. Or https://example.com/b: it's fine."
+    )
@@ -0,0 +1,62 @@
+import asyncio
+
+import httpx
+import pytest
+
+import deadlink
+from deadlink._main import Info
+from deadlink._workers import Shards
+
+
+def test_shards():
+    urls = [f"https://a.com/{k}" for k in range(4)]
+    urls += ["https://b.com/1", "https://b.com/2", "https://c.com/1"]
+    shard = Shards(2, urls)
+    # all URLs of a host go to the same shard; b.com and c.com share the other one
+    assert len({shard(url) for url in urls[:4]}) == 1
+    assert shard("https://b.com/3") == shard("https://c.com/1") != shard(urls[0])
+    # new hosts go to the smaller shard
+    assert Shards(2)("https://a.com") == 0
+
+
+# module-level such that the worker processes can unpickle the transport
+async def _handler(request):
+    if request.url.path == "/slow":
+        await asyncio.sleep(60.0)
+    return httpx.Response(404 if request.url.path == "/dead" else 200)
+
+
+def test_workers():
+    urls = [f"https://host{k}.com/{path}" for k in range(5) for path in ["ok", "dead"]]
+    d = deadlink.categorize_urls(
+        urls,
+        get_fallback_codes=(),
+        transport=httpx.MockTransport(_handler),
+        workers=2,
+    )
+    assert len(d["OK"]) == 5
+    assert d["Client errors"][0] == [Info(404, "https://host0.com/dead")]
+
+
+def test_workers_time_budget():
+    urls = ["https://a.com/ok", "https://b.com/slow", "https://c.com/slow"]
+    d = deadlink.categorize_urls(
+        urls,
+        transport=httpx.MockTransport(_handler),
+        time_budget=3.0,
+        workers=2,
+    )
+    assert d["OK"] == [[Info(200, "https://a.com/ok")]]
+    assert sorted(seq[0].url for seq in d["Not checked"]) == urls[1:]
+
+
+def test_workers_source_error():
+    # an error while the URLs are being discovered stops the workers and is raised
+    def urls():
+        yield "https://a.com/ok"
+        raise OSError("unreadable file")
+
+    with pytest.raises(OSError, match="unreadable file"):
+        deadlink.categorize_urls(
+            urls(), transport=httpx.MockTransport(_handler), workers=2
+        )